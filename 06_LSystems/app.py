@@ -1,15 +1,11 @@
+import queue
+import threading
+import time
 import tkinter as tk
-from math import sin, cos, radians
-
-
-def _parse_axiom(rule, axiom, nesting):
-    """Iteratively parses the axiom according to selected nesting"""
-    for _ in range(nesting):
-        parts = rule.split(" -> ")
-        assert len(parts) == 2, "Not a valid rule! Use format Symbol -> Expand!"
-        axiom = axiom.replace(parts[0], parts[1])
-
-    return axiom
+import numpy as np
+from lsystem import SAVED_PATTERNS, parse_rules
+from instancing import segment_batches
+from raster import rasterize, to_pgm
 
 
 class LSystemApp:
@@ -30,7 +26,11 @@ class LSystemApp:
         # Left frame
         self.canvas = tk.Canvas(self.frame_left, width=900, height=900)
         self.canvas.pack()
-        self.canvas.create_rectangle(0, 0, 900, 900, fill="white")
+
+        # Everything is drawn into a raster that is blitted onto the canvas as one image
+        self.raster = np.full((900, 900), 255, dtype=np.uint8)
+        self.photo = tk.PhotoImage(data=to_pgm(self.raster))
+        self.image_id = self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
 
         self.start_x = tk.Entry(self.frame_right, width=10)
         self.start_x.insert(0, "200")
@@ -95,12 +95,15 @@ class LSystemApp:
 
         # Parts
         self.saved_index = 0
-        self.saved_patterns = [
-            ("F+F+F+F", "F -> F+F-F-FF+F+F-F", "90", "3", "5"),
-            ("F++F++F", "F -> F+F--F+F", "60", "3", "15"),
-            ("F", "F -> F[+F]F[-F]F", "25.7", "3", "18"),
-            ("F", "F -> FF+[+F-F-F]-[-F+F+F]", "22.5", "3", "18"),
-        ]
+        self.instancing = None
+        self.instancing_key = None
+        self.instancing_lock = threading.Lock()
+
+        # Running draw -- its id, cancel flag of its worker thread and queue of computed segment batches
+        self.job = 0
+        self.cancelled = threading.Event()
+        self.batches = None
+        self.saved_patterns = list(SAVED_PATTERNS)
 
     def _draw(self):
         """Collects inputs from user interface, parses the axiom and runs the algorithm"""
@@ -111,45 +114,93 @@ class LSystemApp:
         line_length = int(self.line_length.get())
         angle_change = float(self.angle.get())
         axiom = self.axiom.get()
-        rule = self.rule.get()
-
-        # Adjust axiom
-        axiom = _parse_axiom(rule, axiom, nesting_count)
-        print(axiom)
-
-        # Current pos
-        pos_x = start_x
-        pos_y = start_y
-        angle = start_degree
-
-        # Checkpoints
-        checkpoints = []
-
-        # Run, draw
-        for symbol in axiom:
-            if symbol == " ":
-                continue
-            elif symbol == "[":  # Remember position rule
-                checkpoints.append((pos_x, pos_y, angle))
-            elif symbol == "]":  # Recall rule
-                pos_x, pos_y, angle = checkpoints.pop()
-                print(pos_x, pos_y, angle)
-            elif symbol == "+":  # Turn rule
-                angle -= angle_change
-            elif symbol == "-":  # Turn rule
-                angle += angle_change
-            elif symbol in ["F", "b"]:  # Move, move and draw rules
-                angle_rad = radians(angle)
-                old_x = pos_x
-                old_y = pos_y
-                pos_x = old_x + (sin(angle_rad) * line_length)
-                pos_y = old_y + (cos(angle_rad) * line_length)
-                if symbol == "F":
-                    self.canvas.create_line(old_x, old_y, pos_x, pos_y)
+        rules = parse_rules(self.rule.get())
+
+        # Segments are computed on a worker thread and drawn in time slices, so the window stays responsive
+        self._cancel()
+        self.batches = queue.Queue()
+        thread = threading.Thread(
+            target=self._produce,
+            args=(
+                (axiom, rules, nesting_count, angle_change, line_length, (start_x, start_y), start_degree),
+                self.batches,
+                self.cancelled,
+            ),
+            daemon=True,
+        )
+        thread.start()
+        self.root.after(1, self._consume, self.job, self.batches)
+
+    def _cancel(self):
+        """Stops the running draw -- its worker stops at the next batch and its batches are not drawn anymore"""
+        self.cancelled.set()
+        self.cancelled = threading.Event()
+        self.job += 1
+
+    def _produce(self, parameters, batches, cancelled):
+        """Worker thread -- puts segment batches into the queue, None at the end (or the exception if it failed)"""
+        try:
+            for segments in self._segments(*parameters):
+                if cancelled.is_set():
+                    return
+                batches.put(segments)
+        except Exception as error:
+            batches.put(error)
+            return
+        batches.put(None)
+
+    def _consume(self, job, batches, time_slice=0.03):
+        """Rasterizes batches for one time slice, shows the result and plans itself again until the draw is done"""
+        if job != self.job:
+            return
+        deadline = time.perf_counter() + time_slice
+        done = False
+        while time.perf_counter() < deadline:
+            try:
+                segments = batches.get_nowait()
+            except queue.Empty:
+                break
+            if segments is None:
+                done = True
+                break
+            if isinstance(segments, Exception):
+                raise segments
+            rasterize(segments, self.raster)
+
+        self._refresh()
+        if not done:
+            self.root.after(10, self._consume, job, batches)
+
+    def _segments(self, axiom, rules, nesting_count, angle_change, line_length, start, start_degree, batch=2**15):
+        """Yields segment batches, the instancing interpreter is kept while rules, angle and length stay the same"""
+        with self.instancing_lock:
+            key = (tuple(sorted(rules.items())), angle_change, line_length)
+            batches, self.instancing = segment_batches(
+                axiom,
+                rules,
+                nesting_count,
+                angle_change,
+                line_length,
+                start,
+                start_degree,
+                batch,
+                self.instancing if self.instancing_key == key else None,
+            )
+            self.instancing_key = key
+        yield from batches
+
+    def _refresh(self):
+        """Blits the raster onto the canvas"""
+        self.photo = tk.PhotoImage(data=to_pgm(self.raster))
+        self.canvas.itemconfigure(self.image_id, image=self.photo)
 
     def _reset(self):
-        """Resets the canvas content"""
-        self.canvas.create_rectangle(0, 0, 900, 900, fill="white")
+        """Stops the running draw and resets the canvas content -- the canvas holds just one image item"""
+        self._cancel()
+        self.canvas.delete("all")
+        self.raster[...] = 255
+        self.photo = tk.PhotoImage(data=to_pgm(self.raster))
+        self.image_id = self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
 
     def _cycle_saved(self):
         """Not the most effective implementation -- I did it in a train w/o wifi, tho"""
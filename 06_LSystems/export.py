@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import imageio
+from lsystem import SAVED_PATTERNS, parse_rules
+from instancing import segment_batches
+from raster import rasterize_antialiased
+
+
+def lsystem_segments(axiom, rules, depth, angle, length, start=(0.0, 0.0), heading=90.0):
+    """All segments of the L-system as one (n, 4) array, see segment_batches"""
+    batches, _ = segment_batches(axiom, rules, depth, angle, length, start, heading, batch=2**20)
+    batches = list(batches)
+    return np.concatenate(batches) if batches else np.empty((0, 4))
+
+
+def fit(segments, width, height, margin=0.02):
+    """Scales and moves segments so their bounding box fits into width x height (keeping the aspect ratio)"""
+    if len(segments) == 0:
+        return segments
+    points = segments.reshape(-1, 2)
+    low, high = points.min(axis=0), points.max(axis=0)
+    span = np.maximum(high - low, 1e-12)
+    scale = min(width * (1 - 2 * margin) / span[0], height * (1 - 2 * margin) / span[1])
+    offset = (np.array([width, height]) - span * scale) / 2 - low * scale
+    return (points * scale + offset).reshape(-1, 4)
+
+
+def write_svg(segments, filename, width, height, stroke_width=1.0, decimals=2):
+    """Writes segments as one SVG path, connected segments share points (only "L" instead of "M ... L")"""
+    rounded = np.round(segments, decimals)
+    breaks = np.r_[True, np.any(rounded[1:, 0:2] != rounded[:-1, 2:4], axis=1)]
+    with open(filename, "w", encoding="utf-8") as file:
+        file.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">\n')
+        file.write('<rect width="100%" height="100%" fill="white"/>\n<path fill="none" stroke="black" ')
+        file.write(f'stroke-width="{stroke_width}" d="')
+        for start in range(0, len(rounded), 2**16):
+            file.write(
+                "".join(
+                    f"M{x0:g} {y0:g}L{x1:g} {y1:g}" if new else f"L{x1:g} {y1:g}"
+                    for (x0, y0, x1, y1), new in zip(rounded[start : start + 2**16], breaks[start : start + 2**16])
+                )
+            )
+        file.write('"/>\n</svg>\n')
+
+
+def export_lsystem(filename, axiom, rules, angle, depth, length=1.0, size=(4096, 4096), heading=90.0):
+    """Renders the L-system headlessly into filename -- .svg as a vector path, anything else as anti-aliased raster
+
+    Rules can be given as dict or as text like in LSystemApp ("F -> F[+F]F[-F]F"). The drawing is fitted to size.
+    """
+    if isinstance(rules, str):
+        rules = parse_rules(rules)
+    width, height = size
+    segments = fit(lsystem_segments(axiom, rules, depth, angle, length, heading=heading), width, height)
+    if filename.endswith(".svg"):
+        write_svg(segments, filename, width, height)
+    else:
+        imageio.imwrite(filename, rasterize_antialiased(segments, (height, width)))
+    return segments
+
+
+def export_presets(directory="lsystem_exports", size=(4096, 4096), extensions=(".png", ".svg")):
+    """Exports all SAVED_PATTERNS of LSystemApp, one file per pattern and extension"""
+    os.makedirs(directory, exist_ok=True)
+    for index, (axiom, rules, angle, depth, length) in enumerate(SAVED_PATTERNS):
+        for extension in extensions:
+            filename = os.path.join(directory, f"pattern_{index}{extension}")
+            export_lsystem(filename, axiom, rules, float(angle), int(depth), float(length), size)
+            print(f"Saved '{filename}'")
+
+
+if __name__ == "__main__":
+    export_presets()
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from math import sin, cos, radians
+import numpy as np
+from lsystem import balanced, expand
+from interpreter import TurtleInterpreter
+
+
+class InstancingInterpreter:
+    """Turtle interpreter that builds geometry of every (symbol, depth) only once and reuses it
+
+    Symbol derived depth times always draws the same segments, only rotated and moved by the state of the turtle
+    where it starts. So its segments (drawn from origin with heading 0) and its net transform (heading change and
+    offset of the end point) are computed once, kept in an LRU cache and stamped out with one batched affine
+    transform for all places where the symbol occurs. Time then grows with the number of distinct sub-derivations
+    and the number of output segments, not with the length of the derived string.
+
+    Works only if every rule expansion has balanced brackets (otherwise a symbol has no fixed net transform),
+    TurtleInterpreter handles the rest.
+
+    Attributes:
+        rules (dict): symbol -> expansion
+        angle (float): angle of one turn in degrees
+        length (float): length of one step
+        max_bytes (int): memory budget of cached segments
+        cache (OrderedDict): (symbol, depth) -> (segments, (heading, x, y))
+        nbytes (int): memory used by cached segments
+        hits, misses (int): how many geometries were reused / had to be built
+    """
+
+    def __init__(self, rules, angle, length, max_bytes=256 * 2**20):
+        """Checks the rules and creates empty cache"""
+        for symbol, expansion in rules.items():
+            if not balanced(expansion):
+                raise ValueError(f"Expansion of '{symbol}' has unbalanced brackets")
+        self.rules = rules
+        self.angle = angle
+        self.length = length
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def segments(self, axiom, depth, start=(0.0, 0.0), heading=90.0):
+        """All segments drawn by the axiom derived depth times, (n, 4) array of x0, y0, x1, y1"""
+        if not balanced(axiom):
+            raise ValueError("Axiom has unbalanced brackets")
+        segments, _ = self._compose(axiom, depth)
+        return self._stamp(segments, np.array([heading]), np.array([start], dtype=float))[0]
+
+    def geometry(self, symbol, depth):
+        """Segments and net transform of symbol derived depth times, built on first use"""
+        key = (symbol, depth)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        if depth > 0 and symbol in self.rules:
+            cached = self._compose(self.rules[symbol], depth - 1)
+        else:
+            cached = self._primitive(symbol)
+
+        self.cache[key] = cached
+        self.nbytes += cached[0].nbytes
+        while self.nbytes > self.max_bytes and len(self.cache) > 1:
+            _, (evicted, _) = self.cache.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return cached
+
+    def _primitive(self, symbol):
+        """Geometry of a single symbol, same meaning as in TurtleInterpreter"""
+        if symbol == "F":
+            return np.array([[0.0, 0.0, 0.0, self.length]]), (0.0, 0.0, self.length)
+        if symbol == "b":
+            return np.empty((0, 4)), (0.0, 0.0, self.length)
+        if symbol == "+":
+            return np.empty((0, 4)), (-self.angle, 0.0, 0.0)
+        if symbol == "-":
+            return np.empty((0, 4)), (self.angle, 0.0, 0.0)
+        return np.empty((0, 4)), (0.0, 0.0, 0.0)
+
+    def _compose(self, text, depth):
+        """Walks text (a short rule expansion or axiom) and places geometry of its symbols derived depth times"""
+        placements = {}
+        heading, position_x, position_y = 0.0, 0.0, 0.0
+        stack = []
+        for symbol in text:
+            if symbol == "[":
+                stack.append((heading, position_x, position_y))
+                continue
+            if symbol == "]":
+                heading, position_x, position_y = stack.pop()
+                continue
+
+            segments, (turn, x, y) = self.geometry(symbol, depth)
+            if len(segments):
+                placements.setdefault(symbol, (segments, []))[1].append((heading, position_x, position_y))
+            angle = radians(heading)
+            position_x += cos(angle) * x + sin(angle) * y
+            position_y += -sin(angle) * x + cos(angle) * y
+            heading += turn
+
+        # Every distinct symbol is stamped out at all its places at once
+        parts = []
+        for segments, places in placements.values():
+            places = np.array(places)
+            parts.append(self._stamp(segments, places[:, 0], places[:, 1:]).reshape(-1, 4))
+        segments = np.concatenate(parts) if parts else np.empty((0, 4))
+        return segments, (heading, position_x, position_y)
+
+    @staticmethod
+    def _stamp(segments, headings, offsets):
+        """Copies of segments rotated by headings and moved by offsets, shape (k, n, 4)"""
+        angles = np.radians(headings)[:, np.newaxis, np.newaxis]
+        cosines, sines = np.cos(angles), np.sin(angles)
+        x, y = segments[:, 0::2], segments[:, 1::2]
+        placed = np.empty((len(headings), len(segments), 4))
+        placed[..., 0::2] = cosines * x + sines * y + offsets[:, np.newaxis, 0:1]
+        placed[..., 1::2] = cosines * y - sines * x + offsets[:, np.newaxis, 1:2]
+        return placed
+
+
+def segment_batches(axiom, rules, depth, angle, length, start=(0.0, 0.0), heading=90.0, batch=2**15, instancing=None):
+    """Segments of the L-system in batches of (n, 4) arrays and the instancing interpreter used for them
+
+    If all brackets are balanced, segments are built at once by InstancingInterpreter -- the given one (made for
+    the same rules, angle and length) is reused, so its cache survives between calls. Otherwise symbols are
+    derived lazily and the batches come from TurtleInterpreter one by one, the interpreter is then None.
+    """
+    if not (balanced(axiom) and all(balanced(expansion) for expansion in rules.values())):
+        turtle = TurtleInterpreter(angle, length, start, heading)
+        return turtle.segments(expand(axiom, rules, depth), chunk_size=batch), None
+
+    instancing = instancing or InstancingInterpreter(rules, angle, length)
+    segments = instancing.segments(axiom, depth, start, heading)
+    return (segments[index : index + batch] for index in range(0, len(segments), batch)), instancing
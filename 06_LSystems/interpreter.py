@@ -0,0 +1,137 @@
+import numpy as np
+
+OPEN, CLOSE, LEFT, RIGHT, DRAW, MOVE = (ord(symbol) for symbol in "[]-+Fb")
+
+
+def _chunks(fragments, chunk_size):
+    """Joins string fragments into uint8 arrays of roughly chunk_size symbols"""
+    buffer, buffered = [], 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        buffered += len(fragment)
+        if buffered >= chunk_size:
+            yield np.frombuffer("".join(buffer).encode(), dtype=np.uint8)
+            buffer, buffered = [], 0
+    if buffer:
+        yield np.frombuffer("".join(buffer).encode(), dtype=np.uint8)
+
+
+class TurtleInterpreter:
+    """Turns stream of L-system symbols into NumPy array of line segments, chunk by chunk
+
+    Instead of moving the turtle symbol by symbol, every chunk is solved at once: headings are cumulative sums
+    of turns and positions cumulative sums of steps. Brackets split the chunk into groups (one per [...] pair),
+    the sums run separately inside every group and each group starts from the state saved at its "[".
+    Brackets still open at the end of a chunk are kept in a small preallocated branch stack for the next one.
+
+    Symbols are the same as in LSystemApp -- F move and draw, b move, + turn right, - turn left, [ push, ] pop.
+
+    Attributes:
+        angle (float): angle of one turn in degrees
+        length (float): length of one step
+        state (numpy.ndarray): current heading (degrees), x and y of the turtle
+        stack (numpy.ndarray): preallocated branch stack of saved states, grown when needed
+        depth (int): number of currently open brackets
+    """
+
+    def __init__(self, angle, length, start=(0.0, 0.0), heading=90.0, max_depth=64):
+        """Places the turtle at start, heading 0 points along +y like in the original app"""
+        self.angle = angle
+        self.length = length
+        self.state = np.array([heading, start[0], start[1]], dtype=float)
+        self.stack = np.empty((max_depth, 3))
+        self.depth = 0
+
+    def segments(self, fragments, chunk_size=2**20):
+        """Yields (n, 4) arrays of x0, y0, x1, y1 segments drawn by given string fragments (e.g. lsystem.expand)"""
+        for codes in _chunks(fragments, chunk_size):
+            yield self.interpret(codes)
+
+    def interpret(self, codes):
+        """Interprets one chunk of symbols given as uint8 codes, returns its segments and updates the state"""
+        if len(codes) == 0:
+            return np.empty((0, 4))
+        is_open = codes == OPEN
+        is_close = codes == CLOSE
+
+        # Absolute nesting level of every symbol, "[" and "]" belong to the outer level
+        opened = np.cumsum(is_open)
+        level = self.depth + opened - is_open - np.cumsum(is_close)
+        if level.min() < 0:
+            raise ValueError("Unbalanced brackets, ']' without '['")
+        top = int(level.max()) + 1
+        if top > len(self.stack):
+            self.stack = np.concatenate((self.stack, np.empty((top, 3))))
+
+        # Innermost "[" of this chunk enclosing every symbol, -1 means a group opened before this chunk
+        group = np.full(len(codes), -1)
+        opens = np.flatnonzero(is_open)
+        for value in range(1, top):
+            members = np.flatnonzero(level == value)
+            parents = opens[level[opens] == value - 1]
+            if len(parents) and len(members):
+                inside = np.searchsorted(parents, members, side="right") - 1
+                group[members[inside >= 0]] = parents[inside[inside >= 0]]
+
+        # Stable sort by group, so every group is one continuous run for the segmented cumulative sums
+        key = np.where(group >= 0, group, -1 - level)
+        order = np.argsort(key, kind="stable")
+        starts = np.flatnonzero(np.r_[True, key[order][1:] != key[order][:-1]])
+        run_starts = np.repeat(starts, np.diff(np.r_[starts, len(codes)]))
+
+        # Members of every level split into groups opened before this chunk and groups opened in it
+        by_level = np.argsort(level, kind="stable")
+        bounds = np.searchsorted(level[by_level], np.arange(level.min(), top + 1))
+        levels = []
+        for value, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]), start=int(level.min())):
+            members = by_level[start:end]
+            nested = group[members] >= 0
+            levels.append((value, members[~nested], members[nested], group[members[nested]]))
+
+        # States saved in the branch stack plus the current state are the bases of groups opened before
+        bases = np.vstack((self.stack[: self.depth], self.state))
+
+        turns = np.where(codes == LEFT, self.angle, 0.0) - np.where(codes == RIGHT, self.angle, 0.0)
+        heading = self._resolve(turns[:, np.newaxis], order, run_starts, levels, bases[:, :1])[:, 0]
+
+        moving = (codes == DRAW) | (codes == MOVE)
+        radians = np.radians(heading[moving])
+        steps = np.zeros((len(codes), 2))
+        steps[moving, 0] = np.sin(radians) * self.length
+        steps[moving, 1] = np.cos(radians) * self.length
+        position = self._resolve(steps, order, run_starts, levels, bases[:, 1:])
+
+        # Brackets left open -- the last "[" of every level below the final depth is still open
+        depth = self.depth + int(opened[-1]) - int(np.count_nonzero(is_close))
+        for value in range(depth):
+            last = opens[level[opens] == value]
+            if len(last):
+                self.stack[value] = heading[last[-1]], *position[last[-1]]
+        self.state = np.array([heading[-1], *position[-1]])
+        self.depth = depth
+
+        drawn = codes == DRAW
+        return np.hstack((position[drawn] - steps[drawn], position[drawn]))
+
+    @staticmethod
+    def _resolve(deltas, order, run_starts, levels, bases):
+        """Cumulative sums of deltas inside every group, shifted by the state at the start of the group"""
+        summed = np.cumsum(deltas[order], axis=0)
+        before = np.vstack((np.zeros((1, deltas.shape[1])), summed))[run_starts]
+        local = np.empty_like(deltas)
+        local[order] = summed - before
+
+        # Levels go outside in, so the "[" of every group is resolved before its members
+        result = np.empty_like(deltas)
+        for value, carried, nested, parents in levels:
+            if len(carried):
+                result[carried] = local[carried] + bases[value]
+            result[nested] = local[nested] + result[parents]
+        return result
+
+
+def turtle_segments(fragments, angle, length, start=(0.0, 0.0), heading=90.0, chunk_size=2**20):
+    """All segments drawn by given string fragments as one (n, 4) array of x0, y0, x1, y1"""
+    turtle = TurtleInterpreter(angle, length, start, heading)
+    chunks = list(turtle.segments(fragments, chunk_size))
+    return np.concatenate(chunks) if chunks else np.empty((0, 4))
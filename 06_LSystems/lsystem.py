@@ -0,0 +1,62 @@
+# Premade patterns -- axiom, rules, angle, nesting, line length (as typed into LSystemApp)
+SAVED_PATTERNS = [
+    ("F+F+F+F", "F -> F+F-F-FF+F+F-F", "90", "3", "5"),
+    ("F++F++F", "F -> F+F--F+F", "60", "3", "15"),
+    ("F", "F -> F[+F]F[-F]F", "25.7", "3", "18"),
+    ("F", "F -> FF+[+F-F-F]-[-F+F+F]", "22.5", "3", "18"),
+]
+
+
+def parse_rules(text):
+    """Parses rules like "F -> F+F; X -> F[-X]+X" into dict symbol -> expansion
+
+    Rules are separated by ";" (or new lines), all of them are applied at once in every step.
+    """
+    rules = {}
+    for line in text.replace("\n", ";").split(";"):
+        if not line.strip():
+            continue
+        parts = line.split("->")
+        assert len(parts) == 2, "Not a valid rule! Use format Symbol -> Expand!"
+        symbol, expansion = parts[0].strip(), parts[1].strip()
+        assert len(symbol) == 1, "Not a valid rule! Only single symbols can be expanded!"
+        rules[symbol] = expansion
+    return rules
+
+
+def balanced(text):
+    """True if every "]" in text closes a "[" of the same text and nothing stays open"""
+    depth = 0
+    for symbol in text:
+        depth += (symbol == "[") - (symbol == "]")
+        if depth < 0:
+            return False
+    return depth == 0
+
+
+def expand(axiom, rules, depth):
+    """Lazily derives the axiom depth times, yields the result as a sequence of string fragments
+
+    Symbols are taken from a stack of iterators -- one per derivation level -- so the full string is never built
+    and memory grows with depth, not with the length of the result. Symbols without a rule stay as they are.
+    """
+    if depth <= 0:
+        yield axiom
+        return
+
+    stack = [(iter(axiom), depth)]
+    while stack:
+        symbols, level = stack[-1]
+        symbol = next(symbols, None)
+        if symbol is None:
+            stack.pop()
+            continue
+
+        expansion = rules.get(symbol)
+        if expansion is None:
+            yield symbol
+        elif level == 1:
+            # Last level -- the whole expansion is final, no need to go symbol by symbol
+            yield expansion
+        else:
+            stack.append((iter(expansion), level - 1))
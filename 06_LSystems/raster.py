@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def rasterize(segments, image, value=0, batch=2**18):
+    """Draws (n, 4) segments x0, y0, x1, y1 into 2D image in place, one pixel wide, without any Python loop per segment
+
+    Every segment is sampled at (at most) one pixel steps and the samples are written at once, segments are
+    processed in batches to keep the temporary arrays small. Parts outside of the image are clipped.
+    """
+    height, width = image.shape[:2]
+    for start in range(0, len(segments), batch):
+        x0, y0, x1, y1 = segments[start : start + batch].T
+        samples = np.ceil(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))).astype(np.int64) + 1
+        owner = np.repeat(np.arange(len(samples)), samples)
+        offsets = np.arange(owner.size) - np.repeat(np.cumsum(samples) - samples, samples)
+        t = offsets / np.maximum(samples - 1, 1)[owner]
+
+        columns = np.rint(x0[owner] + t * (x1 - x0)[owner]).astype(np.int64)
+        rows = np.rint(y0[owner] + t * (y1 - y0)[owner]).astype(np.int64)
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        image[rows[inside], columns[inside]] = value
+    return image
+
+
+def to_pgm(image):
+    """Binary PGM (grayscale) or PPM (RGB) bytes of uint8 image, Tk PhotoImage reads them without any extra library"""
+    height, width = image.shape[:2]
+    magic = b"P6" if image.ndim == 3 else b"P5"
+    return b"%s %d %d 255\n" % (magic, width, height) + np.ascontiguousarray(image, dtype=np.uint8).tobytes()
+
+
+def rasterize_antialiased(segments, shape, out=None, tile_size=2048, batch=2**20):
+    """Anti-aliased rendering of (n, 4) segments into uint8 image (white background, black lines)
+
+    Every segment is sampled at half pixel steps and each sample spreads its share of the segment length
+    bilinearly into four pixels, so a pixel crossed by a line gets coverage close to the length of the line inside
+    it. The image is rendered tile by tile with only the segments touching the tile, so huge images (e.g. 16k x 16k,
+    optionally in a memmap given as out) need just one float tile of working memory.
+    """
+    height, width = shape
+    if out is None:
+        out = np.empty(shape, dtype=np.uint8)
+    low = np.minimum(segments[:, 0:2], segments[:, 2:4])
+    high = np.maximum(segments[:, 0:2], segments[:, 2:4])
+
+    for row in range(0, height, tile_size):
+        for col in range(0, width, tile_size):
+            tile_height, tile_width = min(tile_size, height - row), min(tile_size, width - col)
+            touching = (
+                (high[:, 0] >= col - 1)
+                & (low[:, 0] <= col + tile_width)
+                & (high[:, 1] >= row - 1)
+                & (low[:, 1] <= row + tile_height)
+            )
+            coverage = np.zeros((tile_height + 2) * (tile_width + 2))
+            shifted = segments[touching] - (col - 1, row - 1, col - 1, row - 1)
+            for start in range(0, len(shifted), batch):
+                coverage += _splat(shifted[start : start + batch], tile_height + 2, tile_width + 2)
+
+            coverage = coverage.reshape(tile_height + 2, tile_width + 2)[1:-1, 1:-1]
+            out[row : row + tile_height, col : col + tile_width] = 255 - np.rint(255 * np.minimum(coverage, 1))
+    return out
+
+
+def _splat(segments, height, width):
+    """Flat coverage of height x width pixels by given segments, samples outside are dropped"""
+    x0, y0, x1, y1 = segments.T
+    length = np.hypot(x1 - x0, y1 - y0)
+    samples = np.ceil(2 * length).astype(np.int64) + 1
+    owner = np.repeat(np.arange(len(samples)), samples)
+    t = (np.arange(owner.size) - np.repeat(np.cumsum(samples) - samples, samples) + 0.5) / samples[owner]
+    x = x0[owner] + t * (x1 - x0)[owner]
+    y = y0[owner] + t * (y1 - y0)[owner]
+    weight = (length / samples)[owner]
+
+    # Bilinear weights into the four nearest pixel centres, all four summed by one bincount
+    columns, rows = np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+    fx, fy = x - columns, y - rows
+    rows = np.concatenate((rows, rows, rows + 1, rows + 1))
+    columns = np.concatenate((columns, columns + 1, columns, columns + 1))
+    shares = np.concatenate(((1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy)) * np.tile(weight, 4)
+    inside = (rows >= 0) & (rows < height) & (columns >= 0) & (columns < width)
+    return np.bincount(rows[inside] * width + columns[inside], weights=shares[inside], minlength=height * width)
@@ -0,0 +1,154 @@
+import os
+import pickle
+import numpy as np
+
+
+def compile_transformations(transform_list):
+    """Turns (a, b, ..., l) tuples into stacked (k, 3, 3) matrices and (k, 3) offsets
+
+    0-8 -> a-i are the matrix row by row, 9-11 -> j-l the offset vector.
+    """
+    table = np.asarray(transform_list, dtype=float)
+    return table[:, :9].reshape(-1, 3, 3), table[:, 9:12].copy()
+
+
+def determinant_weights(matrices, floor=0.01):
+    """Selection probabilities proportional to |det| of every matrix, i.e. to the volume each transformation covers
+
+    Flat transformations (like the stem of a fern) have zero determinant, so every weight is at least floor times
+    the sum of all determinants, otherwise their part of the attractor would never be drawn.
+    """
+    weights = np.abs(np.linalg.det(matrices))
+    total = weights.sum()
+    if total == 0:
+        return np.full(len(matrices), 1 / len(matrices))
+    weights = np.maximum(weights, floor * total)
+    return weights / weights.sum()
+
+
+class ChaosGame:
+    """Runs many independent IFS walkers (chaos game chains) at once
+
+    Every step, each walker gets its own randomly selected transformation -- indices for all walkers are drawn
+    in one call and all walkers are moved by one batched matrix multiplication.
+
+    Attributes:
+        matrices (numpy.ndarray): (k, 3, 3) linear parts of the transformations
+        offsets (numpy.ndarray): (k, 3) offset vectors of the transformations
+        n_chains (int): number of walkers moved together
+        burn_in (int): steps done before any point is returned, so walkers starting at origin reach the attractor
+        weights (numpy.ndarray): probability of selecting every transformation
+        rng (numpy.random.Generator): source of transformation choices, seedable
+        points (numpy.ndarray): (n_chains, 3) current positions of the walkers
+    """
+
+    def __init__(self, transform_list, n_chains=4096, burn_in=20, seed=None, weights=None):
+        """Precompiles the transformations and places all walkers at origin
+
+        Without weights, transformations are selected proportionally to their determinants (determinant_weights).
+        """
+        self.matrices, self.offsets = compile_transformations(transform_list)
+        if weights is None:
+            self.weights = determinant_weights(self.matrices)
+        else:
+            self.weights = np.asarray(weights, dtype=float) / np.sum(weights)
+        self._cumulative = np.cumsum(self.weights)
+        self._cumulative[-1] = 1.0
+        self.n_chains = n_chains
+        self.burn_in = burn_in
+        self.rng = np.random.default_rng(seed)
+        self.points = np.zeros((n_chains, 3))
+        self._warmed_up = False
+
+    def choose(self, size):
+        """Draws indices of transformations according to weights, in the smallest integer type that holds them all"""
+        indices = np.searchsorted(self._cumulative, self.rng.random(size), side="right")
+        return indices.astype(np.min_scalar_type(len(self.matrices) - 1))
+
+    def step(self, choices=None):
+        """Applies one randomly selected transformation to every walker, returns the new positions"""
+        if choices is None:
+            choices = self.choose(self.n_chains)
+        matrices = self.matrices[choices]
+        self.points = np.einsum("mij,mj->mi", matrices, self.points) + self.offsets[choices]
+        return self.points
+
+    def _warm_up(self):
+        """Does the burn in steps, only once"""
+        if not self._warmed_up:
+            for _ in range(self.burn_in):
+                self.step()
+            self._warmed_up = True
+
+    def generate(self, n_points):
+        """Generates n_points points of the attractor
+
+        Returns:
+            points: np.array, (n_points, 3) IFS fractal points that can be drawn
+        """
+        self._warm_up()
+        n_steps = -(-n_points // self.n_chains)
+        points = np.empty((n_steps * self.n_chains, 3))
+        choices = self.choose((n_steps, self.n_chains))
+        for i in range(n_steps):
+            points[i * self.n_chains : (i + 1) * self.n_chains] = self.step(choices[i])
+        return points[:n_points]
+
+    def chunks(self, n_points, chunk_size=2**20):
+        """Generates n_points points as a sequence of (chunk_size, 3) arrays, the last one can be shorter
+
+        Only one chunk is alive at a time, so the number of points is not limited by memory.
+        """
+        for done in range(0, n_points, chunk_size):
+            yield self.generate(min(chunk_size, n_points - done))
+
+    def accumulate(self, accumulator, n_points, chunk_size=2**20):
+        """Feeds n_points points chunk by chunk into accumulator.add (e.g. DensityHistogram), returns accumulator"""
+        for chunk in self.chunks(n_points, chunk_size):
+            accumulator.add(chunk)
+        return accumulator
+
+    def get_state(self):
+        """Positions of the walkers and state of the random generator, enough to continue the run later"""
+        return {"points": self.points.copy(), "rng": self.rng.bit_generator.state, "warmed_up": self._warmed_up}
+
+    def set_state(self, state):
+        """Continues from a state returned by get_state, the following points are the same as without the break"""
+        self.points = state["points"].copy()
+        self.rng.bit_generator.state = state["rng"]
+        self._warmed_up = state["warmed_up"]
+
+
+def write_points(game, filename, n_points, chunk_size=2**20, resume=False):
+    """Streams n_points points of the game into memory-mapped .npy file, so the run is bounded by disk, not RAM
+
+    After every chunk, the number of written points and state of the game are stored in FILENAME.state.
+    With resume=True, an interrupted run continues from the last stored chunk.
+
+    Returns:
+        points: numpy.memmap, (n_points, 3) points in the file
+    """
+    state_filename = filename + ".state"
+    written = 0
+    if resume and os.path.exists(state_filename):
+        with open(state_filename, "rb") as file:
+            saved = pickle.load(file)
+        game.set_state(saved["game"])
+        written = saved["written"]
+        points = np.lib.format.open_memmap(filename, mode="r+")
+        if points.shape != (n_points, 3):
+            raise ValueError(f"File '{filename}' holds {points.shape[0]} points, not {n_points}")
+    else:
+        points = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float64, shape=(n_points, 3))
+
+    for chunk in game.chunks(n_points - written, chunk_size):
+        points[written : written + len(chunk)] = chunk
+        written += len(chunk)
+        points.flush()
+
+        # Replace the state file at once, so an interruption never leaves it half written
+        with open(state_filename + ".tmp", "wb") as file:
+            pickle.dump({"written": written, "game": game.get_state()}, file)
+        os.replace(state_filename + ".tmp", state_filename)
+
+    return points
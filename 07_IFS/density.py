@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class DensityHistogram:
+    """Accumulates points into a fixed 2D image (or 3D voxel grid) of hit counts
+
+    Memory depends only on the shape of the histogram, not on the number of points, so points can be added
+    chunk by chunk as they are generated and the image gets smoother with every chunk.
+
+    Attributes:
+        lower (numpy.ndarray): lower bounds of the histogram for the selected axes
+        upper (numpy.ndarray): upper bounds of the histogram for the selected axes
+        shape (tuple): number of bins along each selected axis, e.g. (height, width)
+        axes (tuple): which coordinates of the points are used -- (1, 0) means rows follow y, columns follow x
+        counts (numpy.ndarray): hit counts with given shape
+    """
+
+    def __init__(self, lower, upper, shape=(1000, 1000), axes=(1, 0)):
+        """Creates empty histogram covering <lower, upper> along the selected axes"""
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.shape = tuple(shape)
+        self.axes = tuple(axes)
+        self.counts = np.zeros(self.shape, dtype=np.int64)
+
+    @classmethod
+    def from_points(cls, points, shape=(1000, 1000), axes=(1, 0), margin=0.02):
+        """Histogram whose bounds fit given sample of points (plus a small margin)"""
+        selected = points[:, list(axes)]
+        lower, upper = selected.min(axis=0), selected.max(axis=0)
+        pad = (upper - lower) * margin + 1e-12
+        return cls(lower - pad, upper + pad, shape, axes)
+
+    def add(self, points):
+        """Projects points onto the selected axes and adds them to the counts, points outside are ignored"""
+        scaled = (points[:, list(self.axes)] - self.lower) / (self.upper - self.lower) * self.shape
+        bins = np.floor(scaled).astype(np.int64)
+        inside = np.all((bins >= 0) & (bins < self.shape), axis=1)
+        flat = np.ravel_multi_index(tuple(bins[inside].T), self.shape)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.shape)
+
+    def merge(self, other):
+        """Adds counts of another histogram with the same bounds and shape"""
+        self.counts += other.counts
+
+    def tone_map(self, gamma=1.0):
+        """Log-density tone mapping into <0, 1>, so both dense and sparse parts of the attractor stay visible"""
+        density = np.log1p(self.counts.astype(float))
+        peak = density.max()
+        if peak > 0:
+            density /= peak
+        return density**gamma
+
+    def extent(self):
+        """Extent for imshow, only for 2D histograms"""
+        return self.lower[1], self.upper[1], self.lower[0], self.upper[0]
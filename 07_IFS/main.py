@@ -1,5 +1,8 @@
-import numpy as np
+import os
 import matplotlib.pyplot as plt
+from chaos_game import ChaosGame
+from parallel_ifs import parallel_chaos_game
+from density import DensityHistogram
 
 # 0-8 -> a-i, 9-11 -> j-l
 transformations = [
@@ -20,46 +23,45 @@ transformations2 = [
 def run_ifs(transform_list, n_points=10000):
     """Generates n-points based on IFS algorithm and given transformations
 
-    1. Select random transformation
-    2. Compute new point using the selected transformation
-    3. Add the point to history, so it can be drawn later
+    1. Select random transformation for every walker
+    2. Compute new points using the selected transformations (all walkers at once)
+    3. Add the points to history, so they can be drawn later
 
     Returns:
         points: np.array, IFS fractal points that can be drawn
     """
-    points = np.zeros((n_points, 3))
-    current_point = np.array([0.0, 0.0, 0.0])
+    return ChaosGame(transform_list).generate(n_points)
 
-    for i in range(n_points):
-        t = transform_list[np.random.randint(len(transform_list))]
-        a = np.array([[t[0], t[1], t[2]], [t[3], t[4], t[5]], [t[6], t[7], t[8]]])
-        b = np.array([t[9], t[10], t[11]])
-        current_point = a @ current_point + b
-        points[i] = current_point
-    return points
 
+def run_ifs_density(transform_list, n_points=10**7, shape=(1000, 1000), chunk_size=2**20, n_workers=1):
+    """Generates n-points like run_ifs, but accumulates them into a DensityHistogram chunk by chunk
 
-# Run both models
-points1 = run_ifs(transformations)
-points2 = run_ifs(transformations2)
+    Bounds of the histogram are fitted to a short pilot run, then no point is kept longer than one chunk.
+    With more workers, every process fills its own histogram and they are merged at the end.
 
-# Plotting the first model
-fig = plt.figure(figsize=(12, 5))
-ax1 = fig.add_subplot(121, projection="3d")
-ax1.scatter(points1[:, 0], points1[:, 1], points1[:, 2], s=0.2, color="green")
-ax1.set_title("First model")
-ax1.set_xlabel("X")
-ax1.set_ylabel("Y")
-ax1.set_zlabel("Z")
+    Returns:
+        histogram: DensityHistogram, x/y projection of the fractal with hit counts
+    """
+    game = ChaosGame(transform_list)
+    histogram = DensityHistogram.from_points(game.generate(chunk_size), shape)
+    if n_workers > 1:
+        return parallel_chaos_game(transform_list, n_points, histogram, n_workers, chunk_size=chunk_size)
+    return game.accumulate(histogram, n_points, chunk_size)
+
+
+if __name__ == "__main__":
+    # Run both models
+    histogram1 = run_ifs_density(transformations, n_workers=os.cpu_count())
+    histogram2 = run_ifs_density(transformations2, n_workers=os.cpu_count())
 
-# Plotting the second model
-ax2 = fig.add_subplot(122, projection="3d")
-ax2.scatter(points2[:, 0], points2[:, 1], points2[:, 2], s=0.2, color="green")
-ax2.set_title("Second model")
-ax2.set_xlabel("X")
-ax2.set_ylabel("Y")
-ax2.set_zlabel("Z")
+    # Plotting both models as log-density images, scatter of millions of points would not fit in memory
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+    for ax, histogram, title in ((ax1, histogram1, "First model"), (ax2, histogram2, "Second model")):
+        ax.imshow(histogram.tone_map(), cmap="Greens", origin="lower", extent=histogram.extent())
+        ax.set_title(title)
+        ax.set_xlabel("X")
+        ax.set_ylabel("Y")
 
-# Show
-plt.tight_layout()
-plt.show()
+    # Show
+    plt.tight_layout()
+    plt.show()
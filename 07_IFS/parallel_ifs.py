@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from chaos_game import ChaosGame
+
+
+def _run_chains(transform_list, n_points, seed, weights, accumulator, chunk_size):
+    """Worker -- runs its own chaos game from its own random stream
+
+    Returns the filled accumulator, or all generated points if there is no accumulator.
+    """
+    game = ChaosGame(transform_list, seed=seed, weights=weights)
+    if accumulator is None:
+        return game.generate(n_points)
+    return game.accumulate(accumulator, n_points, chunk_size)
+
+
+def parallel_chaos_game(
+    transform_list,
+    n_points,
+    accumulator=None,
+    n_workers=None,
+    seed=None,
+    weights=None,
+    chunk_size=2**20,
+):
+    """Splits n_points between worker processes, each running independent chains, and merges their results
+
+    Every worker gets a copy of the (empty) accumulator and a child of SeedSequence(seed), so the streams never
+    overlap and the result is repeatable for given seed and n_workers. Copies are merged into accumulator
+    by accumulator.merge; without accumulator, points of all workers are joined.
+
+    Returns:
+        result: the accumulator with all points added, or (n_points, 3) np.array of points
+    """
+    n_workers = n_workers or os.cpu_count()
+    shares = [len(part) for part in np.array_split(np.arange(n_points), n_workers)]
+    seeds = np.random.SeedSequence(seed).spawn(n_workers)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(_run_chains, transform_list, share, child, weights, accumulator, chunk_size)
+            for share, child in zip(shares, seeds)
+        ]
+        results = [future.result() for future in futures]
+
+    if accumulator is None:
+        return np.concatenate(results)
+    for result in results:
+        accumulator.merge(result)
+    return accumulator
@@ -0,0 +1,252 @@
+import numpy as np
+
+
+def complex_grid(x, y):
+    """Builds complex grid from x and y axes values -- rows follow y, columns follow x"""
+    grid = np.empty((len(y), len(x)), dtype=np.complex128)
+    grid.real = x[np.newaxis, :]
+    grid.imag = y[:, np.newaxis]
+    return grid
+
+
+def smooth_count(n, z, c, radius=2.0**8):
+    """Fractional escape count of points that escaped radius 2 in iteration n
+
+    n + 1 - log2(log2 |z|) is continuous only for a large escape radius, so the points are iterated a few more
+    times until they leave radius (n grows with them) and the formula is applied there.
+    """
+    z, c = np.broadcast_arrays(z, c)
+    z, c = z.copy(), c.copy()
+    n = np.full(z.shape, n, dtype=np.float64)
+    inside = np.abs(z) <= radius
+    while inside.any():
+        z[inside] = z[inside] * z[inside] + c[inside]
+        n[inside] += 1
+        inside[inside] = np.abs(z[inside]) <= radius
+    return np.maximum(n + 1 - np.log2(np.log2(np.abs(z))), 0).astype(np.float32)
+
+
+def escape_time(z, c, max_iter, periodicity=False, smooth=False):
+    """Computes number of iterations before each point *escapes*, whole grid at once
+
+    Follows the scalar algorithm step by step -- the point is checked against the radius first and only then
+    iterated, so the counts are the same as from FractalDrawer.mandelbrot/julia. Escaped points are dropped from the
+    working arrays, so later iterations only touch points that are still bounded.
+
+    Args:
+        z: np.ndarray (complex), starting values of the sequence
+        c: np.ndarray (complex) or complex, constant added in every iteration (broadcast against z)
+        max_iter: int, maximum amount of iterations per point
+        periodicity: bool, stop iterating points whose orbit returned exactly to a previously saved value (Brent's
+            cycle detection, saved every power of two iterations) -- such a point loops forever, so it never escapes
+        smooth: bool, return fractional counts computed from the value at escape instead of whole numbers
+
+    Returns:
+        counts: np.ndarray (int32, float32 if smooth), iteration counts, max_iter for points that never escaped
+    """
+    z, c = np.broadcast_arrays(np.asarray(z, dtype=np.complex128), np.asarray(c, dtype=np.complex128))
+    shape = z.shape
+    z = z.ravel().copy()
+    c = c.ravel().copy()
+
+    counts = np.full(z.size, max_iter, dtype=np.float32 if smooth else np.int32)
+    active = np.arange(z.size)
+    saved = z.copy()
+    save_at = 1
+
+    for n in range(max_iter):
+        escaped = np.abs(z) > 2
+        if escaped.any():
+            counts[active[escaped]] = smooth_count(n, z[escaped], c[escaped]) if smooth else n
+            bounded = ~escaped
+            active, z, c, saved = active[bounded], z[bounded], c[bounded], saved[bounded]
+            if active.size == 0:
+                break
+        z = z * z + c
+
+        if periodicity:
+            # Periodic points keep max_iter, they are just not iterated anymore
+            periodic = z == saved
+            if periodic.any():
+                looping = ~periodic
+                active, z, c, saved = active[looping], z[looping], c[looping], saved[looping]
+                if active.size == 0:
+                    break
+            if n + 1 == save_at:
+                saved = z.copy()
+                save_at *= 2
+
+    return counts.reshape(shape)
+
+
+def mandelbrot_grid(x, y, max_iter, smooth=False):
+    """Escape counts of Mandelbrot set -- every point is c, sequence starts at 0"""
+    c = complex_grid(x, y)
+    return escape_time(np.zeros_like(c), c, max_iter, smooth=smooth)
+
+
+def julia_grid(x, y, c_const, max_iter, smooth=False):
+    """Escape counts of Julia set -- every point is starting z, c is constant"""
+    return escape_time(complex_grid(x, y), c_const, max_iter, smooth=smooth)
+
+
+def in_main_bulbs(c):
+    """Checks analytically whether points lie in the main cardioid or the period-2 bulb -- those never escape"""
+    x, y = c.real, c.imag
+    y2 = y * y
+    q = (x - 0.25) ** 2 + y2
+    cardioid = q * (q + (x - 0.25)) <= 0.25 * y2
+    bulb = (x + 1) ** 2 + y2 <= 0.0625
+    return cardioid | bulb
+
+
+def mariani_silver(x, y, evaluate, min_size=16, dtype=np.int32, probe_step=4):
+    """Computes escape counts by recursive rectangle subdivision (Mariani-Silver)
+
+    Only borders of rectangles are computed. If the whole border has the same count, the inside is filled without
+    computing it -- for connected sets, regions with the same count have no holes. That holds for the continuous
+    plane, but not for pixels: a filament thinner than one pixel can cross the border between two border pixels
+    and reach inside. So a uniform border is only trusted if a sparse grid of probes (every probe_step-th pixel)
+    inside has the same count too. Even then, the fill is an approximation -- a filament that misses all border
+    pixels and all probes is lost (a few pixels in deep zooms near filaments, e.g. the Seahorse valley).
+    Otherwise, the rectangle is split into four and its children are checked the same way; small rectangles are
+    computed completely. All rectangles of one level are computed in one batch.
+
+    Args:
+        x: np.ndarray, x axes values of pixels
+        y: np.ndarray, y axes values of pixels
+        evaluate: function, takes 1D complex array of pixel values, returns their counts
+        min_size: int, rectangles with smaller side are not split anymore
+        dtype: np.dtype, type of counts returned by evaluate
+        probe_step: int, distance of probes inside rectangles with uniform border, 0 trusts the border alone
+
+    Returns:
+        counts: np.ndarray, iteration counts
+        filled: int, number of pixels that were filled without computing them
+    """
+    height, width = len(y), len(x)
+    counts = np.zeros((height, width), dtype=dtype)
+    done = np.zeros((height, width), dtype=bool)
+    filled = 0
+
+    def compute(rows, cols):
+        """Computes pixels that are not known yet"""
+        flat = np.unique(rows * width + cols)
+        flat = flat[~done.flat[flat]]
+        if flat.size == 0:
+            return
+        points = np.empty(flat.size, dtype=np.complex128)
+        points.real = x[flat % width]
+        points.imag = y[flat // width]
+        counts.flat[flat] = evaluate(points)
+        done.flat[flat] = True
+
+    rectangles = [(0, height - 1, 0, width - 1)]
+    while rectangles:
+        borders = []
+        for row_start, row_end, col_start, col_end in rectangles:
+            rows = np.arange(row_start, row_end + 1)
+            cols = np.arange(col_start, col_end + 1)
+            borders.append((np.full(cols.size, row_start), cols))
+            borders.append((np.full(cols.size, row_end), cols))
+            borders.append((rows, np.full(rows.size, col_start)))
+            borders.append((rows, np.full(rows.size, col_end)))
+        compute(np.concatenate([b[0] for b in borders]), np.concatenate([b[1] for b in borders]))
+
+        # Rectangles with uniform border get a sparse grid of probes inside, filaments thinner than a pixel can
+        # slip between border pixels and the probes catch at least the wider ones
+        candidates, probes = [], []
+        for row_start, row_end, col_start, col_end in rectangles:
+            if row_end - row_start < 2 or col_end - col_start < 2:
+                continue
+            border = np.concatenate(
+                (
+                    counts[row_start, col_start : col_end + 1],
+                    counts[row_end, col_start : col_end + 1],
+                    counts[row_start:row_end, col_start],
+                    counts[row_start:row_end, col_end],
+                )
+            )
+            uniform = bool((border == border[0]).all())
+            probe = None
+            if uniform and probe_step:
+                probe = np.mgrid[
+                    row_start + probe_step : row_end : probe_step, col_start + probe_step : col_end : probe_step
+                ]
+                probes.append((probe[0].ravel(), probe[1].ravel()))
+            candidates.append((row_start, row_end, col_start, col_end, border[0], uniform, probe))
+        if probes:
+            compute(np.concatenate([p[0] for p in probes]), np.concatenate([p[1] for p in probes]))
+
+        split, small = [], []
+        for row_start, row_end, col_start, col_end, value, uniform, probe in candidates:
+            inside = (slice(row_start + 1, row_end), slice(col_start + 1, col_end))
+            if probe is not None:
+                uniform = bool((counts[probe[0], probe[1]] == value).all())
+            if uniform:
+                unknown = ~done[inside]
+                filled += int(unknown.sum())
+                counts[inside][unknown] = value
+                done[inside] = True
+            elif row_end - row_start <= min_size or col_end - col_start <= min_size:
+                rows, cols = np.mgrid[inside]
+                small.append((rows.ravel(), cols.ravel()))
+            else:
+                row_mid = (row_start + row_end) // 2
+                col_mid = (col_start + col_end) // 2
+                split += [
+                    (row_start, row_mid, col_start, col_mid),
+                    (row_start, row_mid, col_mid, col_end),
+                    (row_mid, row_end, col_start, col_mid),
+                    (row_mid, row_end, col_mid, col_end),
+                ]
+
+        if small:
+            compute(np.concatenate([s[0] for s in small]), np.concatenate([s[1] for s in small]))
+        rectangles = split
+
+    return counts, filled
+
+
+def mandelbrot_grid_accelerated(x, y, max_iter, smooth=False, fill=False, min_size=16):
+    """Mandelbrot set with cardioid/bulb check, periodicity check and optionally Mariani-Silver subdivision
+
+    Both checks are exact, so without fill the counts are the same as from mandelbrot_grid. With fill=True, the
+    rectangles are filled by mariani_silver, which is faster, but might miss filaments thinner than one pixel.
+
+    Returns:
+        counts: np.ndarray, iteration counts
+        stats: dict, number of pixels filled by subdivision and resolved by the cardioid/bulb check
+    """
+    stats = {"filled": 0, "interior": 0}
+
+    def evaluate(c):
+        """Skips points inside the main bulbs, iterates the rest"""
+        result = np.full(c.size, max_iter, dtype=dtype)
+        interior = in_main_bulbs(c)
+        stats["interior"] += int(interior.sum())
+        outside = ~interior
+        start = np.zeros(int(outside.sum()), dtype=np.complex128)
+        result[outside] = escape_time(start, c[outside], max_iter, True, smooth)
+        return result
+
+    dtype = np.float32 if smooth else np.int32
+    if fill:
+        counts, stats["filled"] = mariani_silver(x, y, evaluate, min_size, dtype)
+    else:
+        counts = evaluate(complex_grid(x, y).ravel()).reshape(len(y), len(x))
+    return counts, stats
+
+
+def julia_grid_accelerated(x, y, c_const, max_iter, smooth=False, fill=False, min_size=16):
+    """Julia set with periodicity check and optionally Mariani-Silver subdivision, returns counts and stats
+
+    Without fill the counts are the same as from julia_grid, see mandelbrot_grid_accelerated.
+    """
+    dtype = np.float32 if smooth else np.int32
+    if not fill:
+        z = complex_grid(x, y).ravel()
+        counts = escape_time(z, c_const, max_iter, True, smooth).astype(dtype).reshape(len(y), len(x))
+        return counts, {"filled": 0, "interior": 0}
+    counts, filled = mariani_silver(x, y, lambda z: escape_time(z, c_const, max_iter, True, smooth), min_size, dtype)
+    return counts, {"filled": filled, "interior": 0}
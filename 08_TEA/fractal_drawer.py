@@ -1,7 +1,14 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib import colors, colormaps
+from matplotlib import colormaps
 import imageio
+from escape_time import mandelbrot_grid, julia_grid, mandelbrot_grid_accelerated, julia_grid_accelerated
+from parallel_render import TiledRenderer
+from perturbation import to_decimal, reference_orbit, mandelbrot_perturbation_grid, julia_perturbation_grid
 
 
 class FractalDrawer:
@@ -15,6 +22,17 @@ class FractalDrawer:
         color_map="hsv",
         zoom_factor=0.75,
         zoom_center=complex(-1.6, 0),
+        vectorized=True,
+        n_workers=1,
+        tile_size=128,
+        deep_zoom=False,
+        accelerated=False,
+        fill_rectangles=False,
+        tile_cache=None,
+        smooth=True,
+        lut_size=4096,
+        progressive=False,
+        iter_per_decade=100,
     ):
         """Initializes either Mandelbrot or Julia fractal and its parameters.
 
@@ -27,15 +45,48 @@ class FractalDrawer:
             y_bounds: [float, float], range of y axes values
             zoom_center: complex, center of the zoom
             color_map: string, https://matplotlib.org/stable/users/explain/colors/colormaps.html
+            vectorized: bool, use NumPy escape time engine instead of per-pixel Python loop
+            n_workers: int, number of processes for tiled rendering, 1 disables it, None uses all cores
+            tile_size: int, width and height of one tile in pixels when rendering in parallel
+            deep_zoom: bool, render using perturbation around a high precision reference orbit at the view center,
+                which allows zooming far below float64 precision (always vectorized)
+            center: (Decimal, Decimal), exact view center in deep zoom mode
+            x_range, y_range: float, view width and height (exact only in deep zoom mode)
+            accelerated: bool, skip interior points (cardioid/bulb check, periodicity check), vectorized mode only --
+                both checks are exact, the counts stay the same
+            fill_rectangles: bool, with accelerated also fill rectangles with uniform border without computing them
+                (Mariani-Silver) -- faster, but an approximation, filaments thinner than a pixel might be lost
+            skip_stats: dict, how many pixels were filled / resolved analytically in the last accelerated render (with
+                tile_cache, samples of the tiles computed in it)
+            tile_cache: TileCache, reuse already computed quadtree tiles when zooming/panning (vectorized mode only),
+                might be shared between more drawers -- pixels take the nearest tile sample (up to half a pixel
+                away), so the image is an approximation, a few percent of pixels near the set edge differ from
+                the direct render
+            smooth: bool, use fractional escape counts, so the colours have no bands (vectorized mode only)
+            lut: np.ndarray (uint8), lut_size x 3 table of colours sampled from color_map
+            progressive: bool, draw coarse 1/8 resolution preview first, then refine it up to the full resolution
+            iter_per_decade: int, raise max_iter by this much for every 10x zoom (max_iter is the value at the start
+                view), so deeper zooms get enough iterations; None keeps max_iter fixed
         """
         self.set_type = set_type
         self.max_iter = max_iter
+        self.base_max_iter = max_iter
+        self.iter_per_decade = iter_per_decade
+        self.progressive = progressive
         self.resolution = resolution
         self.color_map = color_map
         self.zoom_factor = zoom_factor
+        self.vectorized = vectorized
+        self.accelerated = accelerated
+        self.fill_rectangles = fill_rectangles
+        self.skip_stats = {"filled": 0, "interior": 0}
+        self.tile_cache = tile_cache
+        self.renderer = TiledRenderer(n_workers, tile_size) if n_workers != 1 else None
 
         if color_map not in list(colormaps):
             raise ValueError(f"Invalid color_map: {color_map}")
+        self.smooth = smooth
+        self.lut = colormap_lut(color_map, lut_size)
 
         if set_type == "mandelbrot":
             self.x_bounds = [-2, 1]
@@ -49,6 +100,17 @@ class FractalDrawer:
             raise ValueError("Invalid set_type")
 
         self.c_const = complex(-0.8, 0.156)
+
+        # Deep zoom keeps the center in high precision, bounds are only approximate there
+        self.deep_zoom = deep_zoom
+        self.center = (
+            Decimal(self.x_bounds[0] + self.x_bounds[1]) / 2,
+            Decimal(self.y_bounds[0] + self.y_bounds[1]) / 2,
+        )
+        self.x_range = float(self.x_bounds[1] - self.x_bounds[0])
+        self.y_range = float(self.y_bounds[1] - self.y_bounds[0])
+        self.initial_x_range = self.x_range
+
         self.fig, self.ax = plt.subplots()
         self.fig.canvas.mpl_connect("button_press_event", self.zoom_on_click)
 
@@ -70,43 +132,165 @@ class FractalDrawer:
             z = z * z + c
         return self.max_iter
 
+    def compute_iterations(self, x, y):
+        """Computes iteration counts for every combination of x and y values, rows follow y.
+
+        Vectorized engine iterates the whole grid at once, the scalar one goes pixel by pixel. Both return
+        the same counts, vectorized ones are fractional (float32) when smooth is on.
+        """
+        if not self.vectorized and not self.deep_zoom:
+            image = np.zeros((len(y), len(x)))
+            for i in range(len(y)):
+                for j in range(len(x)):
+                    zx = x[j]
+                    zy = y[i]
+                    z = complex(zx, zy)
+                    if self.set_type == "mandelbrot":
+                        image[i, j] = self.mandelbrot(z)
+                    else:
+                        image[i, j] = self.julia(z)
+            return image
+
+        compute, args = self._engine()
+
+        dtype = np.float32 if self.smooth else np.int32
+        if self.tile_cache is not None and not self.deep_zoom:
+            # Missing tiles go through the tiled renderer too, approximate fill gets its own tiles
+            fill = self.accelerated and self.fill_rectangles
+            key_prefix = (self.set_type, self.c_const, self.max_iter, self.smooth, fill)
+            image = self.tile_cache.render(x, y, key_prefix, compute, args, self.renderer, dtype)
+            tile_stats = self.tile_cache.tile_stats
+        elif self.renderer is not None:
+            image = self.renderer.render(x, y, compute, args, dtype)
+            tile_stats = self.renderer.tile_stats
+        else:
+            image, tile_stats = compute(x, y, *args), [None]
+            if isinstance(image, tuple):
+                image, stats = image
+                tile_stats = [stats]
+
+        if self.accelerated and not self.deep_zoom:
+            self.skip_stats = {key: sum(stats[key] for stats in tile_stats) for key in self.skip_stats}
+        return image
+
+    def _engine(self):
+        """Returns vectorized grid function for current settings and its args"""
+        if self.deep_zoom:
+            return self._perturbation_engine()
+        if self.set_type == "mandelbrot":
+            if self.accelerated:
+                return mandelbrot_grid_accelerated, (self.max_iter, self.smooth, self.fill_rectangles)
+            return mandelbrot_grid, (self.max_iter, self.smooth)
+        if self.accelerated:
+            return julia_grid_accelerated, (self.c_const, self.max_iter, self.smooth, self.fill_rectangles)
+        return julia_grid, (self.c_const, self.max_iter, self.smooth)
+
+    def _perturbation_engine(self):
+        """Computes the reference orbit at the view center, returns perturbation function and its args"""
+        # Few more digits than the zoom depth, so the orbit stays exact well below float64 precision
+        precision = max(30, int(-np.log10(min(self.x_range, self.y_range))) + 20)
+        if self.set_type == "mandelbrot":
+            orbit = reference_orbit((Decimal(0), Decimal(0)), self.center, self.max_iter, precision)
+            return mandelbrot_perturbation_grid, (orbit, self.max_iter, self.smooth)
+        orbit = reference_orbit(self.center, to_decimal(self.c_const), self.max_iter, precision)
+        return julia_perturbation_grid, (orbit, self.max_iter, self.smooth)
+
+    def _axes(self):
+        """Returns x and y values of pixels -- in deep zoom mode these are offsets from the center"""
+        if self.deep_zoom:
+            x = np.linspace(-self.x_range / 2, self.x_range / 2, self.resolution)
+            y = np.linspace(-self.y_range / 2, self.y_range / 2, self.resolution)
+            return x, y
+        x = np.linspace(self.x_bounds[0], self.x_bounds[1], self.resolution)
+        y = np.linspace(self.y_bounds[0], self.y_bounds[1], self.resolution)
+        return x, y
+
+    def _extent(self):
+        """Returns extent of the drawn image -- offsets from the center in deep zoom mode"""
+        if self.deep_zoom:
+            return -self.x_range / 2, self.x_range / 2, -self.y_range / 2, self.y_range / 2
+        return *self.x_bounds, *self.y_bounds
+
     def generate_image(self):
         """Generates image of selected fractal.
 
-        First, an image containing zeros is created. The algorithm then iterates through every pixel of the image,
-        computing whether it belongs to the set or not. After that, the values are normalized into <0, 1> range
-        and transferred to HSV format.
+        First, iteration count is computed for every pixel of the image, determining whether it belongs to the set
+        or not. After that, the values are scaled to the size of colour table and looked up there -- the result
+        is RGB uint8 image.
         """
-        width, height = self.resolution, self.resolution
-        image = np.zeros((height, width))
-        x = np.linspace(self.x_bounds[0], self.x_bounds[1], width)
-        y = np.linspace(self.y_bounds[0], self.y_bounds[1], height)
-
-        for i in range(height):
-            for j in range(width):
-                zx = x[j]
-                zy = y[i]
-                z = complex(zx, zy)
-                if self.set_type == "mandelbrot":
-                    image[i, j] = self.mandelbrot(z)
-                else:
-                    image[i, j] = self.julia(z)
-
-        norm = colors.Normalize(vmin=0, vmax=self.max_iter)
-        colormap = plt.cm.get_cmap(self.color_map)
-        return colormap(norm(image))
+        x, y = self._axes()
+        image = self.compute_iterations(x, y)
+        return apply_lut(image, self.max_iter, self.lut)
+
+    def generate_progressive(self, coarse_step=8):
+        """Generates the image in passes -- 1/coarse_step resolution first, then twice as fine every pass.
+
+        Every pass computes only pixels that were not computed by the previous ones (the coarser grid is a subset
+        of the finer one), pixels that are not computed yet take the value of the nearest computed one.
+
+        Yields:
+            image: np.ndarray (uint8), RGB image in full resolution
+        """
+        x, y = self._axes()
+        counts = np.zeros((len(y), len(x)), dtype=np.float32 if self.smooth else np.int32)
+
+        step = coarse_step
+        while step >= 1:
+            rows = np.arange(0, len(y), step)
+            cols = np.arange(0, len(x), step)
+            if step == coarse_step:
+                counts[np.ix_(rows, cols)] = self.compute_iterations(x[cols], y[rows])
+            else:
+                # Rows the previous pass skipped completely, then the new columns of the rows it computed
+                new_rows = rows[rows % (2 * step) != 0]
+                old_rows = rows[rows % (2 * step) == 0]
+                new_cols = cols[cols % (2 * step) != 0]
+                counts[np.ix_(new_rows, cols)] = self.compute_iterations(x[cols], y[new_rows])
+                counts[np.ix_(old_rows, new_cols)] = self.compute_iterations(x[new_cols], y[old_rows])
+
+            nearest_rows = np.arange(len(y)) // step * step
+            nearest_cols = np.arange(len(x)) // step * step
+            yield apply_lut(counts[np.ix_(nearest_rows, nearest_cols)], self.max_iter, self.lut)
+            step //= 2
+
+    def render_frame(self):
+        """Generates one animation frame as uint8 image, the figure is not touched"""
+        return self.generate_image()
 
     def draw(self):
-        """Draws image of a fractal using Matplotlib."""
+        """Draws image of a fractal using Matplotlib. In progressive mode, every pass is shown as soon as it is done."""
         self.ax.clear()
-        img = self.generate_image()
-        self.ax.imshow(img, extent=(*self.x_bounds, *self.y_bounds), origin="lower")
-        self.ax.axis("off")
-        self.fig.canvas.draw()
+        images = self.generate_progressive() if self.progressive else [self.generate_image()]
+        shown = None
+        for img in images:
+            if shown is None:
+                shown = self.ax.imshow(img, extent=self._extent(), origin="lower")
+                self.ax.axis("off")
+            else:
+                shown.set_data(img)
+            self.fig.canvas.draw()
+            self.fig.canvas.flush_events()
         plt.pause(0)
 
     def zoom_step(self, zoom_center):
-        """Zooms into the fractal around a specific point by reducing x/y bounds."""
+        """Zooms into the fractal around a specific point by reducing x/y bounds.
+
+        In deep zoom mode, zoom_center might also be (Decimal, Decimal) pair, so no precision is lost.
+        """
+        self.x_range *= self.zoom_factor
+        self.y_range *= self.zoom_factor
+        if self.iter_per_decade is not None:
+            # Deeper zooms need more iterations to separate points close to the set
+            depth = np.log10(self.initial_x_range / self.x_range)
+            self.max_iter = int(self.base_max_iter + self.iter_per_decade * max(depth, 0))
+
+        if self.deep_zoom:
+            self.center = to_decimal(zoom_center)
+            x_center, y_center = float(self.center[0]), float(self.center[1])
+            self.x_bounds = [x_center - self.x_range / 2, x_center + self.x_range / 2]
+            self.y_bounds = [y_center - self.y_range / 2, y_center + self.y_range / 2]
+            return
+
         x_range = self.x_bounds[1] - self.x_bounds[0]
         y_range = self.y_bounds[1] - self.y_bounds[0]
 
@@ -122,7 +306,11 @@ class FractalDrawer:
         if event.inaxes is not None:
             x = event.xdata
             y = event.ydata
-            zoom_center = complex(x, y)
+            if self.deep_zoom:
+                # Image is drawn in offsets from the center
+                zoom_center = (self.center[0] + Decimal(x), self.center[1] + Decimal(y))
+            else:
+                zoom_center = complex(x, y)
             self.zoom_step(zoom_center)
             self.draw()
 
@@ -134,8 +322,79 @@ class FractalDrawer:
             print(f"Frame {i + 1}/{frames}")
             img = self.generate_image()
             self.zoom_step(self.zoom_center)
-            images.append((img * 255).astype(np.uint8))
+            images.append(img)
             self.draw()
         plt.close(self.fig)
+        self.close()
 
         imageio.mimsave(f"{self.set_type}_zoom.gif", images, fps=12)
+
+    def export_zoom(self, frames=100, filename=None, fps=12, n_workers=1):
+        """Streams zoom animation straight into a GIF/video file without any GUI, like a headless generate_gif.
+
+        Every frame is written as soon as it is rendered, so memory use does not depend on the number of frames.
+        With more workers, frames are rendered in parallel by separate processes -- they might finish out of order,
+        but they are written in order and only a few of them are kept in flight at once.
+
+        Args:
+            frames: int, number of frames
+            filename: str, output file, SETNAME_zoom.gif by default; mp4 etc. need imageio-ffmpeg
+            fps: int, frames per second
+            n_workers: int, number of frame rendering processes, None uses all cores
+        """
+        filename = filename or f"{self.set_type}_zoom.gif"
+        with imageio.get_writer(filename, fps=fps) as writer:
+            if n_workers == 1:
+                for i in range(frames):
+                    print(f"Frame {i + 1}/{frames}")
+                    writer.append_data(self.render_frame())
+                    self.zoom_step(self.zoom_center)
+                return
+
+            n_workers = n_workers or os.cpu_count()
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                max_pending = 2 * n_workers
+                pending = {}
+                next_frame = 0
+                for i in range(frames):
+                    # Every frame gets its own snapshot of the view, figure and pools are left out
+                    pending[i] = executor.submit(_render_frame, copy.copy(self))
+                    self.zoom_step(self.zoom_center)
+                    while len(pending) >= max_pending or (i == frames - 1 and pending):
+                        print(f"Frame {next_frame + 1}/{frames}")
+                        writer.append_data(pending.pop(next_frame).result())
+                        next_frame += 1
+
+    def __getstate__(self):
+        """Leaves out figure, worker pool and cache, so the drawer can be sent to another process"""
+        state = self.__dict__.copy()
+        state.update(fig=None, ax=None, renderer=None, tile_cache=None)
+        return state
+
+    def close(self):
+        """Shuts down worker processes of the tiled renderer, if there are any"""
+        if self.renderer is not None:
+            self.renderer.close()
+
+
+def _render_frame(drawer):
+    """Worker -- renders one frame of the exported animation"""
+    return drawer.render_frame()
+
+
+def colormap_lut(color_map, size=4096):
+    """Samples matplotlib colormap into size x 3 uint8 colour table"""
+    rgba = colormaps[color_map](np.linspace(0, 1, size))
+    return np.round(rgba[:, :3] * 255).astype(np.uint8)
+
+
+def apply_lut(counts, max_iter, lut):
+    """Maps iteration counts from <0, max_iter> onto the colour table, returns RGB uint8 image
+
+    Indices are kept in uint16 (the table has at most 65536 colours), so they take less memory than the image.
+    """
+    if len(lut) > 2**16:
+        raise ValueError("Colour table has more than 65536 colours")
+    scale = np.float32((len(lut) - 1) / max_iter)
+    indices = np.clip(counts * scale, 0, len(lut) - 1).astype(np.uint16)
+    return lut[indices]
@@ -0,0 +1,124 @@
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+
+def split_tiles(height, width, tile_size):
+    """Splits image into tiles, returns list of (row_start, row_end, col_start, col_end)"""
+    return [
+        (row, min(row + tile_size, height), col, min(col + tile_size, width))
+        for row in range(0, height, tile_size)
+        for col in range(0, width, tile_size)
+    ]
+
+
+def _render_tile(shm_name, shape, dtype, offset, x, y, compute, args):
+    """Worker -- computes one tile with axes x, y and writes it straight into the shared buffer at offset (row, col)
+
+    Only stats are sent back, if compute returns (image, stats) tuple.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        row_start, col_start = offset
+        row_end, col_end = row_start + len(y), col_start + len(x)
+        result = compute(x, y, *args)
+        stats = None
+        if isinstance(result, tuple):
+            result, stats = result
+        image[row_start:row_end, col_start:col_end] = result
+        del image
+    finally:
+        shm.close()
+    return stats
+
+
+def _release_shm(shm):
+    """Closes and removes shared memory segment"""
+    shm.close()
+    shm.unlink()
+
+
+class TiledRenderer:
+    """Renders fractal viewport tile by tile on a process pool
+
+    Pool and buffer are released by close(), or when the renderer is garbage collected (or at exit) if close() is
+    never called, e.g. in the interactive zoom.
+
+    Attributes:
+        n_workers: int, number of worker processes, None means all cores
+        tile_size: int, width and height of one tile in pixels
+        executor: ProcessPoolExecutor, created on first render and reused afterwards
+        shm: SharedMemory, iteration buffer the workers write into
+        tile_stats: list, stats returned by compute for every tile of the last render
+    """
+
+    def __init__(self, n_workers=None, tile_size=128):
+        """Only stores the settings, pool and buffer are created lazily"""
+        self.n_workers = n_workers or os.cpu_count()
+        self.tile_size = tile_size
+        self.executor = None
+        self.shm = None
+        self.tile_stats = []
+        self._finalizers = {}
+
+    def _buffer(self, shape, dtype):
+        """Returns shared buffer big enough for the image, reallocates only if it is too small"""
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self.shm is None or self.shm.size < nbytes:
+            self._release_buffer()
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._finalizers["shm"] = weakref.finalize(self, _release_shm, self.shm)
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    def _release_buffer(self):
+        """Frees the shared buffer"""
+        if self.shm is not None:
+            self._finalizers.pop("shm")()
+            self.shm = None
+
+    def render(self, x, y, compute, args=(), dtype=np.int32, tiles=None):
+        """Computes compute(x_tile, y_tile, *args) for every tile of the x/y grid, returns the whole image
+
+        compute has to be a module level function, so it can be sent to the workers. If it returns (image, stats)
+        tuple, stats of all tiles are kept in tile_stats. If tiles (row_start, row_end, col_start, col_end) are given,
+        only they are computed and pixels outside them are left undefined.
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.n_workers)
+            self._finalizers["executor"] = weakref.finalize(self, self.executor.shutdown)
+
+        shape = (len(y), len(x))
+        image = self._buffer(shape, dtype)
+        if tiles is None:
+            tiles = split_tiles(*shape, self.tile_size)
+        # Every task gets only the axes of its own tile, not the whole x and y
+        futures = [
+            self.executor.submit(
+                _render_tile,
+                self.shm.name,
+                shape,
+                dtype,
+                (row_start, col_start),
+                x[col_start:col_end],
+                y[row_start:row_end],
+                compute,
+                args,
+            )
+            for row_start, row_end, col_start, col_end in tiles
+        ]
+        self.tile_stats = [future.result() for future in futures]
+
+        # Buffer is reused by the next frame, so the result has to be copied out
+        result = image.copy()
+        del image
+        return result
+
+    def close(self):
+        """Shuts down the pool and frees the shared buffer"""
+        if self.executor is not None:
+            self._finalizers.pop("executor")()
+            self.executor = None
+        self._release_buffer()
@@ -0,0 +1,102 @@
+from decimal import Decimal, localcontext
+import numpy as np
+from escape_time import complex_grid, smooth_count
+
+
+def to_decimal(value):
+    """Converts complex number into (re, im) pair of Decimals, pairs are returned as they are"""
+    if isinstance(value, tuple):
+        return value
+    return Decimal(value.real), Decimal(value.imag)
+
+
+def reference_orbit(z0, c, max_iter, precision):
+    """Computes one orbit in high precision, the result is stored as float64 -- only the deltas need to be small
+
+    Args:
+        z0: (Decimal, Decimal), starting point of the orbit
+        c: (Decimal, Decimal), constant added in every iteration
+        max_iter: int, maximum amount of iterations
+        precision: int, number of significant digits used while iterating
+
+    Returns:
+        orbit: np.ndarray (complex), Z_0 ... Z_k, ends with the first escaped value or after max_iter iterations,
+            at least one iteration is always done
+    """
+    with localcontext() as ctx:
+        ctx.prec = precision
+        z_re, z_im = +z0[0], +z0[1]
+        c_re, c_im = +c[0], +c[1]
+        orbit = [complex(z_re, z_im)]
+        for _ in range(max_iter):
+            z_re, z_im = z_re * z_re - z_im * z_im + c_re, 2 * z_re * z_im + c_im
+            orbit.append(complex(z_re, z_im))
+            if z_re * z_re + z_im * z_im > 4:
+                break
+    return np.array(orbit, dtype=np.complex128)
+
+
+def perturbation_escape_time(orbit, delta, delta_c, max_iter, smooth=False):
+    """Escape counts of points given as float64 offsets from the reference orbit
+
+    Every point follows z_n = Z_m + delta_n, where delta_(n+1) = 2 * Z_m * delta_n + delta_n^2 + delta_c.
+    When the full value gets smaller than the delta itself, the delta would lose its precision (glitch) -- the point
+    is then rebased, i.e. the delta is recomputed against the start of the orbit and the point follows it from there.
+    The same happens when the point outlives the reference orbit.
+
+    Args:
+        orbit: np.ndarray (complex), reference orbit from reference_orbit
+        delta: np.ndarray (complex), offsets of starting values from Z_0
+        delta_c: np.ndarray (complex) or complex, offsets of constants from the reference constant
+        max_iter: int, maximum amount of iterations per point
+        smooth: bool, return fractional counts instead of whole numbers
+
+    Returns:
+        counts: np.ndarray (int32, float32 if smooth), iteration counts, max_iter for points that never escaped
+    """
+    delta, delta_c = np.broadcast_arrays(
+        np.asarray(delta, dtype=np.complex128), np.asarray(delta_c, dtype=np.complex128)
+    )
+    shape = delta.shape
+    delta = delta.ravel().copy()
+    delta_c = delta_c.ravel().copy()
+
+    counts = np.full(delta.size, max_iter, dtype=np.float32 if smooth else np.int32)
+    active = np.arange(delta.size)
+    ref_index = np.zeros(delta.size, dtype=np.int64)
+    last_index = len(orbit) - 1
+    reference_c = orbit[1] - orbit[0] ** 2
+
+    for n in range(max_iter):
+        z = orbit[ref_index] + delta
+        escaped = np.abs(z) > 2
+        if escaped.any():
+            counts[active[escaped]] = smooth_count(n, z[escaped], reference_c + delta_c[escaped]) if smooth else n
+            bounded = ~escaped
+            active, z, delta, delta_c, ref_index = (
+                active[bounded], z[bounded], delta[bounded], delta_c[bounded], ref_index[bounded]
+            )
+            if active.size == 0:
+                break
+
+        # Glitch detection and rebasing
+        rebase = (np.abs(z) < np.abs(delta)) | (ref_index == last_index)
+        if rebase.any():
+            delta[rebase] = z[rebase] - orbit[0]
+            ref_index[rebase] = 0
+
+        reference = orbit[ref_index]
+        delta = 2 * reference * delta + delta * delta + delta_c
+        ref_index += 1
+
+    return counts.reshape(shape)
+
+
+def mandelbrot_perturbation_grid(dx, dy, orbit, max_iter, smooth=False):
+    """Mandelbrot set around the reference -- every point differs only in c, sequence starts at 0"""
+    return perturbation_escape_time(orbit, 0, complex_grid(dx, dy), max_iter, smooth)
+
+
+def julia_perturbation_grid(dx, dy, orbit, max_iter, smooth=False):
+    """Julia set around the reference -- every point differs only in the starting value"""
+    return perturbation_escape_time(orbit, complex_grid(dx, dy), 0, max_iter, smooth)
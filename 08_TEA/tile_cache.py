@@ -0,0 +1,140 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class TileCache:
+    """Quadtree tile cache for interactive exploration, least recently used tiles are evicted first
+
+    The plane is covered by a quadtree of square tiles -- level 0 is one tile of root_size, every next level splits
+    each tile into four. Every tile is sampled with tile_pixels x tile_pixels points placed in the centers of its
+    pixels, so neighbouring tiles and levels never compute the same point twice. Viewport is then put together
+    from tiles of the level that is at least as fine as its pixels, so zooming, panning back or rendering the same
+    path again reuses whatever is already computed.
+
+    Attributes:
+        max_bytes: int, memory budget of stored tiles
+        tile_pixels: int, width and height of one tile in samples
+        root_origin: (float, float), bottom left corner of the level 0 tile
+        root_size: float, width and height of the level 0 tile
+        tiles: OrderedDict, (set_type, c_const, max_iter, level, tile_x, tile_y) -> np.ndarray
+        nbytes: int, memory used by stored tiles
+        hits, misses: int, how many tiles were reused / had to be computed
+        tile_stats: list, stats returned by compute for every tile computed in the last render
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, tile_pixels=64, root_origin=(-2.0, -2.0), root_size=4.0):
+        """Creates empty cache"""
+        self.max_bytes = max_bytes
+        self.tile_pixels = tile_pixels
+        self.root_origin = root_origin
+        self.root_size = root_size
+        self.tiles = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.tile_stats = []
+
+    def get(self, key):
+        """Returns stored tile and marks it as recently used, None if it is not stored"""
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+        return tile
+
+    def put(self, key, tile):
+        """Stores tile, evicts least recently used tiles until the budget is met"""
+        if key in self.tiles:
+            self.nbytes -= self.tiles.pop(key).nbytes
+        self.tiles[key] = tile
+        self.nbytes += tile.nbytes
+        while self.nbytes > self.max_bytes and len(self.tiles) > 1:
+            _, evicted = self.tiles.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        """Drops all tiles"""
+        self.tiles.clear()
+        self.nbytes = 0
+
+    def level_for(self, pitch):
+        """Returns the coarsest level whose sample spacing is not bigger than the pixel pitch"""
+        return max(0, int(np.ceil(np.log2(self.root_size / (self.tile_pixels * pitch)))))
+
+    def _samples(self, values, origin, spacing):
+        """Returns global index of the nearest sample for each pixel coordinate"""
+        return np.floor((np.asarray(values) - origin) / spacing).astype(np.int64)
+
+    def _tile_axes(self, level, tile_x, tile_y):
+        """Returns x and y values of samples of the tile -- centers of its pixels"""
+        tile_size = self.root_size / 2**level
+        offsets = (np.arange(self.tile_pixels) + 0.5) * tile_size / self.tile_pixels
+        x = self.root_origin[0] + tile_x * tile_size + offsets
+        y = self.root_origin[1] + tile_y * tile_size + offsets
+        return x, y
+
+    def render(self, x, y, key_prefix, compute, args=(), renderer=None, dtype=np.int32):
+        """Renders x/y grid from cached tiles, computes only the missing ones
+
+        Each pixel takes the value of the nearest tile sample, which is at most half of a pixel away -- the image is
+        an approximation of the direct render, pixels close to the edge of the set might differ. Missing tiles are
+        computed in this process, or all at once by renderer (TiledRenderer) if it is given.
+
+        Args:
+            x: np.ndarray, evenly spaced x axes values of pixels
+            y: np.ndarray, evenly spaced y axes values of pixels
+            key_prefix: tuple, (set_type, c_const, max_iter) -- everything except the tile position
+            compute: function, compute(x, y, *args) returns counts for the grid of the tile
+            renderer: TiledRenderer, computes missing tiles on its process pool
+            dtype: np.dtype, type of counts returned by compute, needed by renderer
+
+        Returns:
+            image: np.ndarray, counts of the viewport, rows follow y
+        """
+        pitch = min(abs(x[-1] - x[0]) / max(len(x) - 1, 1), abs(y[-1] - y[0]) / max(len(y) - 1, 1))
+        level = self.level_for(pitch) if pitch > 0 else 0
+        spacing = self.root_size / 2**level / self.tile_pixels
+
+        columns = self._samples(x, self.root_origin[0], spacing)
+        rows = self._samples(y, self.root_origin[1], spacing)
+        first_x, last_x = columns.min() // self.tile_pixels, columns.max() // self.tile_pixels
+        first_y, last_y = rows.min() // self.tile_pixels, rows.max() // self.tile_pixels
+
+        # Axes of the whole mosaic are put together from axes of its tiles, so every tile has the same samples
+        # no matter how it is computed
+        mosaic_x = np.concatenate([self._tile_axes(level, tile_x, 0)[0] for tile_x in range(first_x, last_x + 1)])
+        mosaic_y = np.concatenate([self._tile_axes(level, 0, tile_y)[1] for tile_y in range(first_y, last_y + 1)])
+        mosaic = np.empty((len(mosaic_y), len(mosaic_x)), dtype=dtype)
+
+        missing = []
+        for tile_y in range(first_y, last_y + 1):
+            for tile_x in range(first_x, last_x + 1):
+                row = (tile_y - first_y) * self.tile_pixels
+                col = (tile_x - first_x) * self.tile_pixels
+                tile = self.get((*key_prefix, level, tile_x, tile_y))
+                if tile is None:
+                    missing.append((tile_x, tile_y, row, col))
+                else:
+                    mosaic[row : row + self.tile_pixels, col : col + self.tile_pixels] = tile
+        self.hits += (last_y - first_y + 1) * (last_x - first_x + 1) - len(missing)
+        self.misses += len(missing)
+
+        # Missing tiles are computed in one go, on the process pool if there is one
+        rectangles = [(row, row + self.tile_pixels, col, col + self.tile_pixels) for _, _, row, col in missing]
+        if renderer is not None and missing:
+            computed = renderer.render(mosaic_x, mosaic_y, compute, args, dtype, rectangles)
+            self.tile_stats = renderer.tile_stats
+        else:
+            computed, self.tile_stats = mosaic, []
+            for row_start, row_end, col_start, col_end in rectangles:
+                tile = compute(mosaic_x[col_start:col_end], mosaic_y[row_start:row_end], *args)
+                stats = None
+                if isinstance(tile, tuple):
+                    tile, stats = tile
+                computed[row_start:row_end, col_start:col_end] = tile
+                self.tile_stats.append(stats)
+        for (tile_x, tile_y, row, col), (row_start, row_end, col_start, col_end) in zip(missing, rectangles):
+            tile = computed[row_start:row_end, col_start:col_end].copy()
+            mosaic[row_start:row_end, col_start:col_end] = tile
+            self.put((*key_prefix, level, tile_x, tile_y), tile)
+
+        return mosaic[np.ix_(rows - first_y * self.tile_pixels, columns - first_x * self.tile_pixels)]
@@ -1,6 +1,17 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import colorchooser
 import numpy as np
+from midpoint import midpoint_displacement, outline
+
+
+def layer_polygon(start, end, iteration_count, offset, roughness, rng, width, bottom):
+    """One polygon of the whole layer -- the ridge line closed along the bottom of the canvas, as flat coordinates"""
+    x, y = outline(*midpoint_displacement(start, end, iteration_count, offset, roughness, rng), width)
+    x = np.r_[x[0], x, x[-1]]
+    y = np.r_[bottom, y, bottom]
+    return np.column_stack((x, y)).ravel().tolist()
 
 
 class LandscapeApp:
@@ -28,6 +39,9 @@ class LandscapeApp:
             0, 0, self.canvas_width, self.canvas_height, fill="lightblue"
         )
 
+        # Id of the running draw, results of older draws are thrown away
+        self.job = 0
+
         self.start_x = tk.Entry(self.frame_right, width=10)
         self.start_x.insert(0, "0")
         self.start_x.grid(row=0, column=1)
@@ -64,20 +78,31 @@ class LandscapeApp:
         self.offset_label = tk.Label(self.frame_right, text="Offset")
         self.offset_label.grid(row=5, column=0)
 
+        self.roughness = tk.Entry(self.frame_right, width=10)
+        self.roughness.insert(0, "1.0")
+        self.roughness.grid(row=6, column=1)
+        self.roughness_label = tk.Label(self.frame_right, text="Roughness")
+        self.roughness_label.grid(row=6, column=0)
+
+        self.seed = tk.Entry(self.frame_right, width=10)
+        self.seed.grid(row=7, column=1)
+        self.seed_label = tk.Label(self.frame_right, text="Seed")
+        self.seed_label.grid(row=7, column=0)
+
         self.color_entry = tk.Entry(self.frame_right, width=10)
         self.color_entry.insert(0, "#000000")
-        self.color_entry.grid(row=6, column=1)
+        self.color_entry.grid(row=8, column=1)
 
         self.color_button = tk.Button(self.frame_right, text="Pick Color", command=self._choose_color)
-        self.color_button.grid(row=7, column=0, columnspan=2)
+        self.color_button.grid(row=9, column=0, columnspan=2)
 
         self.draw = tk.Button(
             self.frame_right, text="Draw", command=self._parse_and_draw
         )
-        self.draw.grid(row=8, column=0, columnspan=2)
+        self.draw.grid(row=10, column=0, columnspan=2)
 
         self.clear = tk.Button(self.frame_right, text="Clear", command=self._clear)
-        self.clear.grid(row=9, column=0, columnspan=2)
+        self.clear.grid(row=11, column=0, columnspan=2)
 
     def _parse_and_draw(self):
         """Parses infor from UI, execs the fractal draw"""
@@ -87,55 +112,61 @@ class LandscapeApp:
         end_y = int(self.end_y.get())
         iteration_count = int(self.iteration_count.get())
         offset = int(self.offset.get())
+        roughness = float(self.roughness.get())
+        seed = int(self.seed.get()) if self.seed.get().strip() else None
         color = self.color_entry.get()
 
-        self._draw_fractal(start_x, start_y, end_x, end_y, iteration_count, offset, color)
-
-    def _draw_fractal(self, start_x, start_y, end_x, end_y, iteration_count, offset, color):
-        """Reccursively splits the line; when recursion stops, draws polygons"""
-        # Find line center and new y
-        center_x = (start_x + end_x) / 2
-        center_y = (start_y + end_y) / 2
-        center_y += offset if np.random.rand() > 0.5 else -offset
-
-        # Kill recursion
-        if iteration_count == 1:
-            self.canvas.create_polygon(
-                start_x,
-                start_y,
-                center_x,
-                self.canvas_height,
-                (start_x, start_y),
-                (start_x, self.canvas_height),
-                (center_x, self.canvas_height),
-                (center_x, center_y),
-                fill=color,
-            )
-            self.canvas.create_polygon(
-                center_x,
-                center_y,
-                end_x,
-                self.canvas_height,
-                (center_x, center_y),
-                (center_x, self.canvas_height),
-                (end_x, self.canvas_height),
-                (end_x, end_y),
-                fill=color,
-            )
-            return
-
-        # Call recursively
-        self._draw_fractal(
-            start_x, start_y, center_x, center_y, iteration_count - 1, offset, color
-        )
-        self._draw_fractal(
-            center_x, center_y, end_x, end_y, iteration_count - 1, offset, color
+        self._draw_fractal(start_x, start_y, end_x, end_y, iteration_count, offset, color, roughness, seed)
+
+    def _draw_fractal(self, start_x, start_y, end_x, end_y, iteration_count, offset, color, roughness=1.0, seed=None):
+        """Computes the layer on a worker thread and draws it as one polygon, so the window stays responsive"""
+        self._cancel()
+        result = queue.Queue()
+        parameters = (
+            (start_x, start_y),
+            (end_x, end_y),
+            iteration_count,
+            offset,
+            roughness,
+            np.random.default_rng(seed),
+            self.canvas_width,
+            self.canvas_height,
         )
+        thread = threading.Thread(target=self._produce, args=(parameters, result), daemon=True)
+        thread.start()
+        self.root.after(1, self._consume, self.job, result, color)
+
+    def _cancel(self):
+        """Forgets the running draw -- its polygon is not drawn when it is done"""
+        self.job += 1
+
+    @staticmethod
+    def _produce(parameters, result):
+        """Worker thread -- puts the polygon of the layer into the queue, or the error that stopped it"""
+        try:
+            result.put(layer_polygon(*parameters))
+        except Exception as error:
+            result.put(error)
+
+    def _consume(self, job, result, color):
+        """Draws the polygon once it is computed, until then plans itself again"""
+        if job != self.job:
+            return
+        try:
+            polygon = result.get_nowait()
+        except queue.Empty:
+            self.root.after(10, self._consume, job, result, color)
+            return
+        if isinstance(polygon, Exception):
+            raise polygon
+        self.canvas.create_polygon(*polygon, fill=color)
 
     def _clear(self):
-        """Clears the canvas to original color"""
+        """Stops the running draw and clears the canvas to selected color -- old items are deleted, not covered"""
+        self._cancel()
+        self.canvas.delete("all")
         color = self.color_entry.get()
-        self.canvas.create_rectangle(0, 0, 900, 900, fill=color)
+        self.canvas.create_rectangle(0, 0, self.canvas_width, self.canvas_height, fill=color)
 
     def _choose_color(self):
         """Allows user to pick a color"""
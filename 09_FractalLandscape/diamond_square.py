@@ -0,0 +1,156 @@
+import numpy as np
+import imageio
+from matplotlib import colormaps
+
+
+def _fill(heights, roughness, scale, seed, band_rows):
+    """Diamond-square on a square array (ndarray or memmap) of 2^k + 1 points, level by level in bands of rows
+
+    Every level first sets centres of all squares (diamond step) and then midpoints of all their edges (square step)
+    with uniform noise in <-scale, scale>; scale is multiplied by roughness after every level. Points on the border
+    average only the neighbours that exist. A level is done band by band -- each band reads only the rows of the
+    current grid it needs (plus one row of centres above it), so the whole map is never in memory (band_rows=None
+    means one band per level). Noise of every band has its own random stream derived from (seed, level, step, band).
+    Bands only split the work of one global algorithm, so there are no seams between them.
+    """
+    sequence = np.random.SeedSequence(seed)
+
+    def noise(level, kind, band, shape):
+        """Uniform noise of one band, independent of all other bands"""
+        rng = np.random.default_rng(np.random.SeedSequence([sequence.entropy, level, kind, band]))
+        return rng.uniform(-scale, scale, shape)
+
+    size = heights.shape[0]
+    heights[0 :: size - 1, 0 :: size - 1] = noise(0, 0, 0, (2, 2))
+    step, level = size - 1, 1
+    while step > 1:
+        half = step // 2
+        n_squares = (size - 1) // step
+        per_band = n_squares + 1 if band_rows is None else max(1, band_rows // step)
+
+        # Diamond step -- centre of every square is the average of its corners
+        for band, first in enumerate(range(0, n_squares, per_band)):
+            last = min(first + per_band, n_squares)
+            corners = np.asarray(heights[first * step : last * step + 1 : step, ::step], dtype=np.float64)
+            centers = (corners[:-1, :-1] + corners[:-1, 1:] + corners[1:, :-1] + corners[1:, 1:]) / 4
+            heights[first * step + half : last * step : step, half::step] = centers + noise(
+                level, 1, band, centers.shape
+            )
+
+        # Square step -- midpoints of vertical edges (rows of centres) and of horizontal edges (rows of corners)
+        for band, first in enumerate(range(0, n_squares + 1, per_band)):
+            last = min(first + per_band, n_squares + 1)
+            corners = np.asarray(heights[first * step : last * step + 1 : step, ::step], dtype=np.float64)
+            above = max(first - 1, 0)
+            centers = np.asarray(heights[above * step + half : last * step : step, half::step], dtype=np.float64)
+
+            # Vertical edges between corner rows first .. last, centres left and right of them
+            own = centers[first - above : first - above + len(corners) - 1]
+            total = corners[:-1] + corners[1:]
+            count = np.full(total.shape, 2.0)
+            total[:, 1:] += own
+            count[:, 1:] += 1
+            total[:, :-1] += own
+            count[:, :-1] += 1
+            heights[first * step + half : last * step : step, ::step] = total / count + noise(
+                level, 2, band, total.shape
+            )
+
+            # Horizontal edges in corner rows first .. last - 1, centres above and below them
+            rows = corners[: last - first]
+            total = rows[:, :-1] + rows[:, 1:]
+            count = np.full(total.shape, 2.0)
+            index = np.arange(first, last)
+            for has_center, center_row in ((index >= 1, index - 1), (index < n_squares, index)):
+                total[has_center] += centers[center_row[has_center] - above]
+                count[has_center] += 1
+            heights[first * step : last * step : step, half::step] = total / count + noise(
+                level, 3, band, total.shape
+            )
+
+        scale *= roughness
+        step, level = half, level + 1
+    return heights
+
+
+def diamond_square(levels, roughness=0.5, scale=1.0, seed=None):
+    """Heightmap of (2^levels + 1) x (2^levels + 1) points built by diamond-square, level by level in NumPy
+
+    Returns:
+        heights: np.array of float32
+    """
+    size = 2**levels + 1
+    return _fill(np.zeros((size, size), dtype=np.float32), roughness, scale, seed, None)
+
+
+def diamond_square_mapped(filename, levels, roughness=0.5, scale=1.0, seed=None, band_rows=2048):
+    """Diamond-square heightmap too big for RAM, computed in bands of rows straight in memory-mapped .npy file
+
+    With band_rows=None every level is one band and the result is the same as diamond_square with the same seed.
+
+    Returns:
+        heights: numpy.memmap, (2^levels + 1) x (2^levels + 1) float32
+    """
+    size = 2**levels + 1
+    heights = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float32, shape=(size, size))
+    _fill(heights, roughness, scale, seed, band_rows)
+    heights.flush()
+    return heights
+
+
+def shade(
+    heights, color_map="terrain", azimuth=315.0, altitude=45.0, z_factor=1.0, ambient=0.35, band=1024, out=None
+):
+    """Colours heights by color_map and lights them from azimuth/altitude (degrees), returns RGB uint8 image
+
+    Works in bands of rows (with one row of overlap for gradients), so a memory-mapped heightmap is only read band
+    by band; z_factor exaggerates the relief. The image is written into out, or into a new array -- it is 3/4 of
+    the size of the float32 heightmap, so for maps that do not fit in RAM, out has to be memory-mapped too
+    (see shade_mapped).
+    """
+    low = min(float(heights[row : row + band].min()) for row in range(0, len(heights), band))
+    high = max(float(heights[row : row + band].max()) for row in range(0, len(heights), band))
+    lut = (colormaps[color_map](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.float32)
+    azimuth, altitude = np.radians(azimuth), np.radians(altitude)
+    light = np.array([np.cos(altitude) * np.sin(azimuth), -np.cos(altitude) * np.cos(azimuth), np.sin(altitude)])
+
+    image = np.empty((*heights.shape, 3), dtype=np.uint8) if out is None else out
+    for row in range(0, len(heights), band):
+        start, end = max(row - 1, 0), min(row + band + 1, len(heights))
+        block = np.asarray(heights[start:end], dtype=np.float32)
+        normalized = (block - low) / max(high - low, 1e-12)
+
+        # Surface normals from gradients of the relief scaled to the map size
+        d_row, d_col = np.gradient(normalized * z_factor * len(heights) / 4)
+        norm = np.sqrt(d_row**2 + d_col**2 + 1)
+        lit = np.clip((-d_col * light[0] - d_row * light[1] + light[2]) / norm, 0, 1)
+
+        colors = lut[np.rint(normalized * 255).astype(np.int64)] * (ambient + (1 - ambient) * lit)[..., np.newaxis]
+        image[row : row + band] = colors[row - start : row - start + band].astype(np.uint8)
+    return image
+
+
+def shade_mapped(heights, filename, **shade_options):
+    """Shaded image of a heightmap too big for RAM, written band by band straight into memory-mapped .npy file
+
+    Returns:
+        image: numpy.memmap, RGB uint8 image with the shape of heights
+    """
+    image = np.lib.format.open_memmap(filename, mode="w+", dtype=np.uint8, shape=(*heights.shape, 3))
+    shade(heights, out=image, **shade_options)
+    image.flush()
+    return image
+
+
+def export_shaded(heights, filename, step=None, max_pixels=2**26, **shade_options):
+    """Writes shaded heightmap as an image without any window, step > 1 takes only every step-th point
+
+    Image formats are encoded from one array in memory, so without step the smallest step is picked that keeps
+    the image within max_pixels (64M pixels, 192 MB by default). Full resolution of huge maps is left to
+    shade_mapped.
+    """
+    if step is None:
+        step = 1
+        while (-(-len(heights) // step)) * (-(-heights.shape[1] // step)) > max_pixels:
+            step += 1
+    imageio.imwrite(filename, shade(heights[::step, ::step], **shade_options))
@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def midpoint_displacement(start, end, iterations, offset, roughness=1.0, rng=None):
+    """Builds the whole ridge line by midpoint displacement, level by level
+
+    In every level, midpoints of all current segments are computed at once and moved up or down by the offset
+    (random sign), then the offset is multiplied by roughness -- 1.0 keeps it constant, 0.5 gives the classic
+    fractal terrain where details get smaller with every level.
+
+    Returns:
+        x, y: np.arrays of 2^iterations + 1 points from start to end
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    n_segments = 2**iterations
+    x = np.linspace(start[0], end[0], n_segments + 1)
+    y = np.empty(n_segments + 1)
+    y[0], y[-1] = start[1], end[1]
+
+    step = n_segments
+    for _ in range(iterations):
+        half = step // 2
+        centers = (y[:-1:step] + y[step::step]) / 2
+        y[half::step] = centers + np.where(rng.random(centers.size) > 0.5, offset, -offset)
+        offset *= roughness
+        step = half
+    return x, y
+
+
+def outline(x, y, width):
+    """Reduces the line to at most one point per pixel column (the highest one, y grows down as in Tkinter)
+
+    More points than pixels cannot be seen anyway, but they would make the canvas polygon huge.
+    """
+    if len(x) <= 2 * width:
+        return x, y
+    columns = np.floor(x).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    return x[starts], np.minimum.reduceat(y, starts)
@@ -0,0 +1,135 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+# Every block of rows has its own random stream, so the result does not depend on how the board is split
+RNG_BLOCK_ROWS = 256
+
+
+def work_buffers(*shape):
+    """Random numbers, burning mask, spread mask and generic mask for a strip of rows (or a stack of boards)"""
+    return (
+        np.empty(shape, dtype=np.float32),
+        np.empty(shape, dtype=bool),
+        np.empty(shape, dtype=bool),
+        np.empty(shape, dtype=bool),
+    )
+
+
+def mark_spread(strip, burning, spread, above=None, below=None):
+    """Marks burning cells into burning and cells with a burning neighbour (von Neumann) into spread, in place"""
+    np.equal(strip, 2, out=burning)
+    spread[...] = False
+    spread[..., 1:, :] |= burning[..., :-1, :]
+    spread[..., :-1, :] |= burning[..., 1:, :]
+    spread[..., :, 1:] |= burning[..., :, :-1]
+    spread[..., :, :-1] |= burning[..., :, 1:]
+    if above is not None:
+        spread[..., 0, :] |= above == 2
+    if below is not None:
+        spread[..., -1, :] |= below == 2
+
+
+def apply_rules(strip, new_strip, random, regrowth_probability, ignition_probability, buffers, above=None, below=None):
+    """Writes the next state of a strip (or a stack of boards, rules work on the last two axes) into new_strip
+
+    Burning neighbours (von Neumann) are found by shifting the burning mask in all four directions. Empty and tree
+    cells never overlap, so one random number per cell serves both regrowth and self ignition. Probabilities might
+    be arrays broadcast against the strip, e.g. one value per board of a stack.
+
+    Args:
+        strip: np.ndarray (uint8), current state
+        new_strip: np.ndarray (uint8), the next state is written here
+        random: np.ndarray (float32), one uniform random number per cell
+        buffers: tuple, work buffers from work_buffers, only burning, spread and generic mask are used
+        above, below: np.ndarray (uint8), halo rows next to the strip, None at the board edge
+
+    Returns:
+        stats: tuple, numbers of empty, tree and burning cells of the current state and the size of its fire front
+    """
+    _, burning, spread, mask = buffers
+
+    # Fire spread rule -- mark cells with burning neighbour, including the halo rows
+    mark_spread(strip, burning, spread, above, below)
+
+    # Regrowth rule -- 0 -> 1
+    np.less(random, regrowth_probability, out=mask)
+    mask &= strip == 0
+    np.add(strip, mask, out=new_strip)
+
+    # Fire spread rule, self ignition rule -- 1 -> 2, spread is narrowed to trees next to fire (the fire front)
+    trees = strip == 1
+    spread &= trees
+    np.less(random, ignition_probability, out=mask)
+    mask &= trees
+    mask |= spread
+    new_strip += mask
+
+    # Fire extinguish rule -- 2 -> 0
+    new_strip -= burning
+    new_strip -= burning
+
+    # Statistics of the old state from the masks built above, totals over the whole strip (or stack)
+    n_trees = np.count_nonzero(trees)
+    n_burning = np.count_nonzero(burning)
+    return strip.size - n_trees - n_burning, n_trees, n_burning, np.count_nonzero(spread)
+
+
+def step_strip(board, new_board, row_start, row_end, block_rngs, regrowth_probability, ignition_probability, buffers):
+    """Computes rows row_start:row_end of the next state, reads one halo row above and below the strip
+
+    Random numbers are drawn for all cells of each row block in one go, from the stream of that block.
+
+    Args:
+        board: np.ndarray (uint8), current state of the whole board
+        new_board: np.ndarray (uint8), the next state is written here
+        row_start, row_end: int, rows of the strip, row_start has to be a multiple of RNG_BLOCK_ROWS
+        block_rngs: dict, row block index -> np.random.Generator of that block
+        buffers: tuple, work buffers from work_buffers with the shape of the strip
+
+    Returns:
+        stats: tuple, statistics of the strip in the current state, see apply_rules
+    """
+    random = buffers[0]
+    for row in range(row_start, row_end, RNG_BLOCK_ROWS):
+        block = random[row - row_start : min(row + RNG_BLOCK_ROWS, row_end) - row_start]
+        block_rngs[row // RNG_BLOCK_ROWS].random(out=block, dtype=np.float32)
+
+    return apply_rules(
+        board[row_start:row_end],
+        new_board[row_start:row_end],
+        random,
+        regrowth_probability,
+        ignition_probability,
+        buffers,
+        board[row_start - 1] if row_start > 0 else None,
+        board[row_end] if row_end < len(board) else None,
+    )
+
+
+def strip_worker(shm_names, shape, row_start, row_end, block_rngs, probabilities, barrier, stop, results, stats):
+    """Worker process -- steps its own strip of the shared board, synchronized by the barrier
+
+    Boards are double buffered in shared memory, so halo rows written by neighbouring workers in the previous step
+    are read directly. First barrier starts a step, second one says all strips are written. Statistics of the strip
+    (see apply_rules) are written into stats, a shared int64 array of 4 values owned by this worker. When stopped,
+    the random streams of its blocks are sent back through the results queue.
+    """
+    shms = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    boards = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf) for shm in shms]
+    buffers = work_buffers(row_end - row_start, shape[1])
+    current = 0
+    try:
+        while True:
+            barrier.wait()
+            if stop.value:
+                results.put(block_rngs)
+                break
+            stats[:] = step_strip(
+                boards[current], boards[1 - current], row_start, row_end, block_rngs, *probabilities, buffers
+            )
+            current = 1 - current
+            barrier.wait()
+    finally:
+        del boards
+        for shm in shms:
+            shm.close()
@@ -0,0 +1,128 @@
+import glob
+import numpy as np
+
+
+def tree_cluster_sizes(board):
+    """Sizes of connected clusters of trees (von Neumann neighbourhood)
+
+    Connected components are found by min-label hooking over all tree-tree edges, followed by pointer jumping,
+    repeated until no edge connects two different roots -- everything stays in NumPy.
+    """
+    width = board.shape[1]
+    trees = (board == 1).reshape(-1)
+    grid = trees.reshape(board.shape)
+
+    # Tree-tree edges to the right and down, as pairs of flat indices
+    right = np.flatnonzero((grid[:, :-1] & grid[:, 1:]).reshape(-1))
+    right = right + right // (width - 1) if width > 1 else right
+    down = np.flatnonzero((grid[:-1] & grid[1:]).reshape(-1))
+    first = np.concatenate((right, down))
+    second = np.concatenate((right + 1, down + width))
+
+    parent = np.arange(trees.size)
+    while True:
+        root_first, root_second = parent[first], parent[second]
+        linked = root_first != root_second
+        if not linked.any():
+            break
+        low = np.minimum(root_first[linked], root_second[linked])
+        high = np.maximum(root_first[linked], root_second[linked])
+        np.minimum.at(parent, high, low)
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+    sizes = np.bincount(parent[trees])
+    return sizes[sizes > 0]
+
+
+class FireMetrics:
+    """Per-step statistics of a forest fire run, written incrementally as .npz chunks
+
+    Every step stores counts of empty, tree and burning cells and the size of the fire front (trees next to fire),
+    taken from ForestFire.stats, which every engine fills in during its update -- recording them does not touch the
+    board. Every cluster_every steps, tree clusters are labelled and their sizes are stored as a histogram with
+    power-of-two bins (bin b holds clusters of size 2^b ... 2^(b+1) - 1). Labelling scans the whole board and costs
+    30 to 70 dense steps, so on big boards the samples are spread further apart -- at least one step per
+    cluster_cells cells of the board. Nothing is kept about the boards themselves, only chunk_size rows are buffered
+    before they are written to PATH_00000.npz, PATH_00001.npz...
+
+    Attributes:
+        path (str): prefix of chunk files
+        chunk_size (int): number of steps per chunk
+        cluster_every (int): minimal number of steps between cluster samples, 0 disables them
+        cluster_cells (int): board cells labelled per recorded step on average at most
+        n_bins (int): number of histogram bins
+        chunk_index (int): index of the next chunk file
+    """
+
+    def __init__(self, path, chunk_size=10000, cluster_every=500, n_bins=40, cluster_cells=2048):
+        """Prepares empty buffers"""
+        self.path = path
+        self.chunk_size = chunk_size
+        self.cluster_every = cluster_every
+        self.cluster_cells = cluster_cells
+        self.n_bins = n_bins
+        self.chunk_index = 0
+        self._reset()
+
+    def _reset(self):
+        """Empties the buffered rows"""
+        self.steps = []
+        self.counts = []
+        self.fronts = []
+        self.cluster_steps = []
+        self.cluster_histograms = []
+
+    def record(self, step, forest):
+        """Records statistics of step of ForestFire, called right after its update_board
+
+        Counts and front come from forest.stats, i.e. describe the board at step the update started from. Clusters
+        are labelled on the current board, which is already the one of step + 1.
+        """
+        empty, tree, burning, front = forest.stats
+        self.steps.append(step)
+        self.counts.append((empty, tree, burning))
+        self.fronts.append(front)
+
+        interval = max(self.cluster_every, -(-forest.board.size // self.cluster_cells))
+        if self.cluster_every and (step + 1) % interval == 0:
+            sizes = tree_cluster_sizes(forest.board)
+            bins = np.minimum(np.log2(sizes).astype(np.int64), self.n_bins - 1) if sizes.size else sizes
+            self.cluster_steps.append(step + 1)
+            self.cluster_histograms.append(np.bincount(bins, minlength=self.n_bins))
+
+        if len(self.steps) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered rows into the next chunk file"""
+        if not self.steps:
+            return
+        counts = np.array(self.counts, dtype=np.int64)
+        np.savez(
+            f"{self.path}_{self.chunk_index:05d}.npz",
+            step=np.array(self.steps, dtype=np.int64),
+            empty=counts[:, 0],
+            tree=counts[:, 1],
+            burning=counts[:, 2],
+            front=np.array(self.fronts, dtype=np.int64),
+            cluster_step=np.array(self.cluster_steps, dtype=np.int64),
+            cluster_histogram=np.array(self.cluster_histograms, dtype=np.int64).reshape(-1, self.n_bins),
+        )
+        self.chunk_index += 1
+        self._reset()
+
+    def close(self):
+        """Writes the rest of the buffered rows"""
+        self.flush()
+
+
+def load_metrics(path):
+    """Loads all chunks written by FireMetrics and joins them column by column"""
+    chunks = [np.load(name) for name in sorted(glob.glob(f"{glob.escape(path)}_[0-9][0-9][0-9][0-9][0-9].npz"))]
+    if not chunks:
+        raise FileNotFoundError(f"No metrics chunks found for '{path}'")
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0].files}
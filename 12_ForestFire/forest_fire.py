@@ -1,6 +1,31 @@
+import multiprocessing as mp
+import weakref
+from multiprocessing import shared_memory
 import numpy as np
 import matplotlib.pyplot as plt
 import imageio
+from fire_engine import RNG_BLOCK_ROWS, work_buffers, mark_spread, step_strip, strip_worker
+
+# Colours of empty, tree and burning cells, indexed directly by the board
+PALETTE = np.array([(40, 20, 40), (0, 125, 0), (255, 125, 0)], dtype=np.uint8)
+
+
+def upscale(image, scale):
+    """Enlarges image scale times in both directions -- every pixel becomes scale x scale block"""
+    height, width, channels = image.shape
+    blocks = np.broadcast_to(image[:, np.newaxis, :, np.newaxis, :], (height, scale, width, scale, channels))
+    return blocks.reshape(height * scale, width * scale, channels)
+
+
+def _release_workers(workers, shms):
+    """Last resort cleanup of the parallel engine when close() was not called -- kills workers, frees shared memory"""
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+        worker.join()
+    for shm in shms:
+        shm.close()
+        shm.unlink()
 
 
 class ForestFire:
@@ -11,81 +36,259 @@ class ForestFire:
         density (float): initial density of trees in the board
         regrowth_probability (float): probability of tree regrowth
         ignition_probability (float): probability of tree self igniting
-        board (numpy.ndarray): 2D array representing the board
+        board (numpy.ndarray): 2D uint8 array representing the board
+        tmp_board (numpy.ndarray): second buffer, next state is written here and then the buffers are swapped
+        rng (numpy.random.Generator): random source of board init and sparse engine, seedable
+        block_rngs (dict): row block index -> independent random stream used by dense and parallel engines
+        engine (str): "dense" updates every cell, "sparse" only follows the fire front (for huge, mostly idle boards),
+            "parallel" splits the board into strips stepped by n_workers processes (same result as "dense"),
+            close() turns it into "dense"
+        front (numpy.ndarray): flat indices of burning cells, kept by the sparse engine
+        counts (numpy.ndarray): number of empty, tree and burning cells, kept up to date by the sparse engine
+        stats (tuple): numbers of empty, tree and burning cells and the fire front size of the board the last
+            update_board started from, None before the first step -- every engine gets them from masks (or index
+            arrays) it builds for the update anyway, so reading them costs nothing
     """
 
-    def __init__(self, board_size, density, regrowth_probability, ignition_probability):
+    def __init__(
+        self,
+        board_size,
+        density,
+        regrowth_probability,
+        ignition_probability,
+        seed=None,
+        engine="dense",
+        n_workers=None,
+    ):
         """Init Forest fire parameters and prepare the board"""
         self.board_size = board_size
         self.density = density
         self.regrowth_probability = regrowth_probability
         self.ignition_probability = ignition_probability
+        self.engine = engine
+        self.stats = None
+
+        board_seed, block_seed = np.random.SeedSequence(seed).spawn(2)
+        self.rng = np.random.default_rng(board_seed)
+        n_blocks = -(-board_size // RNG_BLOCK_ROWS)
+        self.block_rngs = dict(enumerate(np.random.default_rng(s) for s in block_seed.spawn(n_blocks)))
 
-        self.board = np.zeros((board_size, board_size))
-        self.tmp_board = np.zeros((board_size, board_size))
+        shape = (board_size, board_size)
+        self.board = np.zeros(shape, dtype=np.uint8)
         self.initialize_board()
 
-        # Matplotlib settings
-        plt.ion()
-        plt.axis("off")
+        # Work buffers of the dense engine, the parallel one allocates them only if fire_front_size needs them
+        self._buffers = None
+        if engine == "dense":
+            # Second buffer and work buffers, so the update does not allocate anything
+            self.tmp_board = np.zeros(shape, dtype=np.uint8)
+            self._buffers = work_buffers(*shape)
+        elif engine == "sparse":
+            self.front = np.flatnonzero(self.board == 2)
+            self.counts = np.bincount(self.board.reshape(-1), minlength=3)
+        elif engine == "parallel":
+            self._start_workers(n_workers or mp.cpu_count())
+        else:
+            raise ValueError("Invalid engine")
 
     def initialize_board(self):
         """Initialize the board with trees and fire"""
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                if np.random.rand() < self.density:
-                    self.board[i, j] = 1
+        # Row blocks keep the temporary random array small even for huge boards
+        block = max(1, 2**22 // self.board_size)
+        for row in range(0, self.board_size, block):
+            rows = self.board[row : row + block]
+            rows[...] = self.rng.random(rows.shape, dtype=np.float32) < self.density
 
     def update_board(self):
-        """Create tmp board and update the board based on forest fire rules
+        """Advance the board by one step using the selected engine"""
+        if self.engine == "sparse":
+            self._update_sparse()
+        elif self.engine == "parallel":
+            self._update_parallel()
+        else:
+            self._update_dense()
+
+    def _update_dense(self):
+        """Compute next state into tmp board, then swap the buffers
 
         0 -- Empty, no tree here
         1 -- Living tree
         2 -- Burning tree"""
-        self.tmp_board = self.board.copy()
-
-        for i in range(self.board_size):
-            for j in range(self.board_size):
-                # Regrowth rule -- if the index is dirt, the tree can regrow
-                if self.board[i, j] == 0:
-                    if np.random.rand() < self.regrowth_probability:
-                        self.tmp_board[i, j] = 1
-                # Fire spread rule, self ignition rule -- if the index is tree, it might burn
-                elif self.board[i, j] == 1:
-                    if i > 0 and self.board[i - 1, j] == 2:
-                        self.tmp_board[i, j] = 2
-                    elif i < self.board_size - 1 and self.board[i + 1, j] == 2:
-                        self.tmp_board[i, j] = 2
-                    elif j > 0 and self.board[i, j - 1] == 2:
-                        self.tmp_board[i, j] = 2
-                    elif j < self.board_size - 1 and self.board[i, j + 1] == 2:
-                        self.tmp_board[i, j] = 2
-                    else:
-                        if np.random.rand() < self.ignition_probability:
-                            self.tmp_board[i, j] = 2
-                # Fire extinguish rule -- if the index is burning, it will become dirt
-                elif self.board[i, j] == 2:
-                    self.tmp_board[i, j] = 0
-
-        self.board = self.tmp_board
-
-    def render_board(self, gif=False):
-        """Copy board, convert colors and display it in matplotlib"""
-        colors = {
-            0: (40, 20, 40),
-            1: (0, 125, 0),
-            2: (255, 125, 0),
-        }
-
-        height, width = self.board.shape
-        rgb_board = np.zeros((height, width, 3), dtype=np.uint8)
-
-        for key, color in colors.items():
-            rgb_board[self.board == key] = color
+        self.stats = step_strip(
+            self.board,
+            self.tmp_board,
+            0,
+            self.board_size,
+            self.block_rngs,
+            self.regrowth_probability,
+            self.ignition_probability,
+            self._buffers,
+        )
+        self.board, self.tmp_board = self.tmp_board, self.board
+
+    def _start_workers(self, n_workers):
+        """Moves the board into shared memory and starts one process per strip
+
+        Strips are made of whole row blocks, each worker takes the random streams of its blocks with it.
+        """
+        shape = self.board.shape
+        self._shms = [shared_memory.SharedMemory(create=True, size=self.board.nbytes) for _ in range(2)]
+        boards = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf) for shm in self._shms]
+        boards[0][...] = self.board
+        self.board, self.tmp_board = boards
+
+        blocks = np.array_split(np.arange(len(self.block_rngs)), min(n_workers, len(self.block_rngs)))
+        self._barrier = mp.Barrier(len(blocks) + 1)
+        self._stop = mp.Value("b", False)
+        self._results = mp.Queue()
+        self._stats = [mp.Array("q", 4, lock=False) for _ in blocks]
+        self._workers = []
+        for strip, stats in zip(blocks, self._stats):
+            row_start = int(strip[0]) * RNG_BLOCK_ROWS
+            row_end = min((int(strip[-1]) + 1) * RNG_BLOCK_ROWS, self.board_size)
+            worker = mp.Process(
+                target=strip_worker,
+                args=(
+                    [shm.name for shm in self._shms],
+                    shape,
+                    row_start,
+                    row_end,
+                    {block: self.block_rngs[block] for block in strip},
+                    (self.regrowth_probability, self.ignition_probability),
+                    self._barrier,
+                    self._stop,
+                    self._results,
+                    stats,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+        self._finalizer = weakref.finalize(self, _release_workers, self._workers, self._shms)
+
+    def _update_parallel(self):
+        """Let the workers do one step, then swap the shared buffers and sum statistics of the strips"""
+        self._barrier.wait()
+        self._barrier.wait()
+        self.stats = tuple(int(sum(column)) for column in zip(*self._stats))
+        self.board, self.tmp_board = self.tmp_board, self.board
+
+    def close(self):
+        """Stops worker processes and frees shared memory of the parallel engine, the simulation goes on as "dense"
+
+        Workers send back their random streams, so the dense steps continue exactly where the parallel ones stopped.
+        """
+        if self.engine != "parallel":
+            return
+        self._stop.value = True
+        self._barrier.wait()
+        for _ in self._workers:
+            self.block_rngs.update(self._results.get())
+        for worker in self._workers:
+            worker.join()
+
+        self.board = self.board.copy()
+        self.tmp_board = self.tmp_board.copy()
+        self._finalizer()
+        if self._buffers is None:
+            self._buffers = work_buffers(*self.board.shape)
+        self.engine = "dense"
+
+    def __enter__(self):
+        """ForestFire can be used in a with block, close() is called at its end"""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stops the parallel engine"""
+        self.close()
+
+    def _random_cells(self, probability):
+        """Flat indices of cells picked independently with given probability, drawn as geometric gaps
+
+        Only the picked cells are generated, so the cost depends on their count, not on the board size.
+        """
+        size = self.board.size
+        if probability <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        expected = size * probability
+        batch = int(expected + 5 * np.sqrt(expected)) + 16
+        chunks = []
+        position = -1
+        while position < size:
+            cells = position + np.cumsum(self.rng.geometric(probability, batch))
+            chunks.append(cells[cells < size])
+            position = cells[-1]
+        return np.concatenate(chunks)
+
+    def _neighbours(self, cells):
+        """Flat indices of von Neumann neighbours of given flat indices, left/right only within the same row"""
+        size = self.board_size
+        column = cells % size
+        return np.concatenate(
+            (
+                cells[cells >= size] - size,
+                cells[cells < self.board.size - size] + size,
+                cells[column > 0] - 1,
+                cells[column < size - 1] + 1,
+            )
+        )
+
+    def fire_front_size(self):
+        """Number of trees next to a burning tree, i.e. trees the fire spreads to in the next step
+
+        Scans the board, use stats while stepping -- they have the same value for free.
+        """
+        if self.engine == "sparse":
+            neighbours = self._neighbours(self.front)
+            return np.unique(neighbours[self.board.reshape(-1)[neighbours] == 1]).size
+
+        # Same shifted masks as in the update, written into the work buffers, so nothing is allocated
+        if self._buffers is None:
+            self._buffers = work_buffers(*self.board.shape)
+        _, burning, spread, mask = self._buffers
+        mark_spread(self.board, burning, spread)
+        np.equal(self.board, 1, out=mask)
+        mask &= spread
+        return np.count_nonzero(mask)
+
+    def _update_sparse(self):
+        """Event driven update -- only burning cells and a random sample of cells are touched
+
+        Spread is checked only around the fire front. Self ignition and regrowth pick cells independently with
+        their probabilities (geometric gaps between picked cells), picked cells of the wrong state are ignored,
+        which gives the same distribution as one coin flip per cell. All checks use the old state."""
+        flat = self.board.reshape(-1)
+        front = self.front
+
+        # Fire spread rule -- only neighbours of the front, the trees found are the fire front of the old state
+        neighbours = self._neighbours(front)
+        spread = np.unique(neighbours[flat[neighbours] == 1])
+        self.stats = (*(int(count) for count in self.counts), spread.size)
+
+        # Self ignition rule -- spread cells are already burning, so only the other trees are picked up
+        flat[spread] = 2
+        candidates = self._random_cells(self.ignition_probability)
+        ignited = np.concatenate((spread, candidates[flat[candidates] == 1]))
+
+        # Regrowth rule
+        candidates = self._random_cells(self.regrowth_probability)
+        regrown = candidates[flat[candidates] == 0]
+
+        # Fire extinguish rule, then write the new states
+        flat[front] = 0
+        flat[ignited] = 2
+        flat[regrown] = 1
+        self.front = ignited
+        self.counts += (front.size - regrown.size, regrown.size - ignited.size, ignited.size - front.size)
+
+    def render_board(self, gif=False, scale=3):
+        """Convert board to colors through the palette and display it in matplotlib (or upscale it for gif)"""
+        rgb_board = PALETTE[self.board]
 
         # Either render the board in gif or in matplotlib
         if gif:
-            rgb_board = np.kron(rgb_board, np.ones((3, 3, 1), dtype=np.uint8))
+            rgb_board = upscale(rgb_board, scale)
         else:
             plt.imshow(rgb_board)
             plt.show()
@@ -94,19 +297,45 @@ class ForestFire:
         # Return board
         return rgb_board
 
-    def run_forest_fire(self):
-        """Run the forest fire loop"""
-        while True:
-            self.render_board()
-            self.update_board()
+    def run_forest_fire(self, metrics=None):
+        """Run the forest fire loop, optionally recording FireMetrics of every step"""
+        # Matplotlib settings
+        plt.ion()
+        plt.axis("off")
 
-    def run_with_gif(self, steps=240, gif_filename="forest_fire.gif"):
-        """Run simulation for N steps and save to GIF"""
-        frames = []
-        for _ in range(steps):
-            rgb_board = self.render_board(gif=True)
-            frames.append(rgb_board)
-            self.update_board()
+        step = 0
+        try:
+            while True:
+                self.render_board()
+                self.update_board()
+                if metrics is not None:
+                    metrics.record(step, self)
+                step += 1
+        finally:
+            if metrics is not None:
+                metrics.close()
+
+    def run_with_gif(self, steps=240, gif_filename="forest_fire.gif", metrics=None, every=1, scale=3, fps=6):
+        """Run simulation for N steps and save to GIF (or video), optionally recording FireMetrics of every step
+
+        Headless -- no GUI is started. Every k-th frame is streamed straight into the file as soon as it is
+        rendered, so memory stays flat no matter how long the simulation is.
+        """
+        with imageio.get_writer(gif_filename, fps=fps) as writer:
+            for step in range(steps):
+                if step % every == 0:
+                    writer.append_data(self.render_board(gif=True, scale=scale))
+                self.update_board()
+                if metrics is not None:
+                    metrics.record(step, self)
 
-        imageio.mimsave(gif_filename, frames, fps=6)
+        if metrics is not None:
+            metrics.close()
         print(f"GIF saved as '{gif_filename}'")
+
+    def run(self, steps, metrics):
+        """Run simulation for N steps without any rendering, only recording FireMetrics"""
+        for step in range(steps):
+            self.update_board()
+            metrics.record(step, self)
+        metrics.close()
@@ -0,0 +1,68 @@
+import numpy as np
+from fire_engine import work_buffers, apply_rules
+
+
+class ForestFireEnsemble:
+    """K independent forest fire boards stepped together, meant for parameter sweeps -- no matplotlib involved
+
+    Attributes:
+        board_size (int): size of every board
+        density (float): initial density of trees
+        regrowth_probabilities (numpy.ndarray): probability of tree regrowth, one per board
+        ignition_probabilities (numpy.ndarray): probability of tree self igniting, one per board
+        boards (numpy.ndarray): (K, N, N) uint8 array, same states as ForestFire.board
+        rng (numpy.random.Generator): source of all random draws, seedable
+    """
+
+    def __init__(self, board_size, density, regrowth_probabilities, ignition_probabilities, seed=None):
+        """Prepares K boards, probabilities are broadcast against each other to get K"""
+        regrowth, ignition = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(regrowth_probabilities, dtype=float)),
+            np.atleast_1d(np.asarray(ignition_probabilities, dtype=float)),
+        )
+        self.board_size = board_size
+        self.density = density
+        self.regrowth_probabilities = regrowth.copy()
+        self.ignition_probabilities = ignition.copy()
+        self.rng = np.random.default_rng(seed)
+
+        shape = (len(regrowth), board_size, board_size)
+        self.boards = (self.rng.random(shape, dtype=np.float32) < density).astype(np.uint8)
+        self.tmp_boards = np.zeros(shape, dtype=np.uint8)
+        self._buffers = work_buffers(*shape)
+
+    @classmethod
+    def from_grid(cls, board_size, density, regrowth_values, ignition_values, seed=None):
+        """Ensemble with one board for every combination of regrowth and ignition probability"""
+        regrowth, ignition = np.meshgrid(regrowth_values, ignition_values, indexing="ij")
+        return cls(board_size, density, regrowth.ravel(), ignition.ravel(), seed)
+
+    def update_boards(self):
+        """Steps all boards at once with the same rules as ForestFire, then swaps the buffers"""
+        random = self.rng.random(out=self._buffers[0], dtype=np.float32)
+        apply_rules(
+            self.boards,
+            self.tmp_boards,
+            random,
+            self.regrowth_probabilities[:, np.newaxis, np.newaxis],
+            self.ignition_probabilities[:, np.newaxis, np.newaxis],
+            self._buffers,
+        )
+        self.boards, self.tmp_boards = self.tmp_boards, self.boards
+
+    def counts(self):
+        """Number of empty, tree and burning cells of every board, shape (K, 3)"""
+        return np.stack([np.count_nonzero(self.boards == state, axis=(1, 2)) for state in range(3)], axis=1)
+
+    def run(self, steps, burn_in=0):
+        """Steps all boards, returns mean density of empty, tree and burning cells per board after burn_in steps
+
+        Returns:
+            densities: numpy.ndarray, shape (K, 3)
+        """
+        total = np.zeros((len(self.boards), 3))
+        for step in range(steps):
+            self.update_boards()
+            if step >= burn_in:
+                total += self.counts()
+        return total / (max(steps - burn_in, 1) * self.board_size**2)